@@ -2,7 +2,10 @@ import streamlit as st
 from dotenv import load_dotenv
 
 from utils.roles import ROLES
-from utils.db import get_user, create_user, update_user_role, get_all_clients
+from utils.db import (
+    get_user, create_user, update_user_role, list_clients, warm_up,
+    watch_user, get_user_version,
+)
 
 from std_components.auth import login_screen, onboarding_role_selection
 from std_components.client import render_client
@@ -28,9 +31,21 @@ def get_tz():
 st.set_page_config(page_title="AI Coaching Assistant", layout="wide")
 load_dotenv()
 
+# Connect to the database in the background while the first page renders
+warm_up()
 
-def fetch_all_clients():
-    return get_all_clients()
+
+# How often a session checks its live user document for outside changes (a
+# coach's edits); the session's own writes rerun the page themselves
+LIVE_REFRESH_SECONDS = 15
+
+
+@st.fragment(run_every=LIVE_REFRESH_SECONDS)
+def live_refresh(user_email: str):
+    # Only compares local counters; the snapshot listener does the fetching
+    if get_user_version(user_email) == st.session_state.get("current_user_version"):
+        return
+    st.rerun()
 
 
 # --- Login UI ---
@@ -49,6 +64,9 @@ if "calendar_update_counter" not in st.session_state:
 if "edit_selected_goal" not in st.session_state:
     st.session_state.edit_selected_goal = ""
 
+# Keep a live local copy of this user's document for the whole process
+watch_user(st.user.email)
+
 # Get or create current user
 if "current_user" not in st.session_state:
     user = get_user({
@@ -68,6 +86,14 @@ if "current_user" not in st.session_state:
 
     st.session_state.current_user = user
 
+# Pick up changes to the user's document (own writes, coach edits) from the live copy
+user_version = get_user_version(st.user.email)
+if st.session_state.get("current_user_version") != user_version:
+    refreshed_user = get_user({"email": st.user.email})
+    if refreshed_user is not None:
+        st.session_state.current_user = refreshed_user
+    st.session_state.current_user_version = user_version
+
 
 # --- Onboarding for first-time users ---
 if st.session_state.current_user.first_time_user:
@@ -76,9 +102,9 @@ if st.session_state.current_user.first_time_user:
     st.stop()
 
 
-# --- Fetch clients list if coach ---
+# --- Fetch first page of client summaries if coach ---
 if "all_clients" not in st.session_state and st.session_state.current_user.role == "coach":
-    st.session_state.all_clients = get_all_clients()
+    st.session_state.all_clients, st.session_state.clients_cursor = list_clients(st.session_state.current_user.email)
 
 # --- Get user timezone ---
 if "client_tz" not in st.session_state:
@@ -86,6 +112,7 @@ if "client_tz" not in st.session_state:
 
 # --- Render sidebar ---
 sidebar(st.session_state.current_user)
+live_refresh(st.user.email)
 
 # --- Render dashboards ---
 if st.session_state.current_user.role == "coach":
@@ -0,0 +1,99 @@
+"""
+Write throughput of the in-memory storage backend as the store grows.
+
+Seeds a MemoryClient with users shaped like the app's (a plan, goal contexts
+and a few check-ins each), then times:
+
+- a one-document batch commit,
+- a transactional read-modify-write append to one goal context,
+- concurrent transactional appends from several threads, checking none are
+  lost.
+
+    python -m benchmarks.bench_memory_db --users 1000 8000
+"""
+import argparse
+import statistics
+import threading
+import time
+
+from utils.memory_db import MemoryClient, memory_transactional
+
+CHECKINS_PER_USER = 5
+
+
+def _seed(users: int) -> dict:
+    docs = {}
+    for i in range(users):
+        email = f"user{i}@example.com"
+        goals = {f"g{j}": {"title": f"Goal {j}", "task": "Do it", "importance": "medium"} for j in range(5)}
+        docs[f"users/{email}"] = {
+            "role": "client",
+            "currentPlan": goals,
+            "goalContext": {goal_id: "Q: How did it go?\nA: Fine.\n" * 20 for goal_id in goals},
+        }
+        for k in range(CHECKINS_PER_USER):
+            docs[f"users/{email}/checkins/{k}"] = {"date": f"2025-01-0{k + 1}", "goals": goals}
+    return docs
+
+
+@memory_transactional
+def _append(transaction, ref, field_path: str, entry: str) -> None:
+    data = ref.get(field_paths=[field_path], transaction=transaction).to_dict()
+    context = data.get("goalContext", {}).get(field_path.split(".")[1], "")
+    transaction.update(ref, {field_path: context + entry})
+
+
+def _time_ms(fn, repeat: int) -> float:
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        times.append((time.perf_counter() - start) * 1000)
+    return statistics.median(times)
+
+
+def bench(users: int, repeat: int, threads: int, appends: int) -> None:
+    client = MemoryClient(_seed(users))
+    ref = client.document("users/user0@example.com")
+
+    def commit():
+        batch = client.batch()
+        batch.update(ref, {"role": "client"})
+        batch.commit()
+
+    commit_ms = _time_ms(commit, repeat)
+    append_ms = _time_ms(lambda: _append(client.transaction(), ref, "goalContext.g0", "x"), repeat)
+
+    before = len(ref.get().get("goalContext.g1"))
+
+    def worker(n):
+        for i in range(appends):
+            _append(client.transaction(), ref, "goalContext.g1", f"<{n}:{i}>")
+
+    workers = [threading.Thread(target=worker, args=(n,)) for n in range(threads)]
+    start = time.perf_counter()
+    for worker_thread in workers:
+        worker_thread.start()
+    for worker_thread in workers:
+        worker_thread.join()
+    elapsed = time.perf_counter() - start
+
+    context = ref.get().get("goalContext.g1")
+    survived = sum(f"<{n}:{i}>" in context[before:] for n in range(threads) for i in range(appends))
+    print(f"{users:>7} users  commit {commit_ms:7.3f}ms  transaction {append_ms:7.3f}ms  "
+          f"concurrent {survived}/{threads * appends} appends in {elapsed * 1000:.1f}ms")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--users", type=int, nargs="+", default=[1000, 8000])
+    parser.add_argument("--repeat", type=int, default=50)
+    parser.add_argument("--threads", type=int, default=4)
+    parser.add_argument("--appends", type=int, default=5, help="appends per thread")
+    args = parser.parse_args()
+    for users in args.users:
+        bench(users, args.repeat, args.threads, args.appends)
+
+
+if __name__ == "__main__":
+    main()
@@ -2,7 +2,7 @@ import streamlit as st
 
 from custom_calendar import calendar
 from utils.constants import CALENDAR_OPTIONS, TIME_INTERVAL
-from utils.db import get_user, save_user_events
+from utils.db import save_user_events
 
 from datetime import datetime, timedelta, time, timezone
 def parse_utc_time(utc_str):
@@ -93,11 +93,6 @@ def render_calendar(client):
                         st.session_state.calendar_events.append(event)
                         st.session_state["calendar_update_counter"] += 1
                         save_user_events(client.email, st.session_state.calendar_events)
-                        st.session_state.current_user = get_user({
-                            "email": st.user.email,
-                            "name": st.user.name,
-                            "role": 'client'
-                        })
                         st.rerun()
 
         elif cb_type == "eventClick":
@@ -180,11 +175,6 @@ def render_calendar(client):
                                 st.session_state.hide_event_editor = True
                                 del st.session_state.editing_event
                                 save_user_events(client.email, st.session_state.calendar_events)
-                                st.session_state.current_user = get_user({
-                                    "email": st.user.email,
-                                    "name": st.user.name,
-                                    "role": 'client' # only used to validate coaches, null falls back to client
-                                })
                                 st.rerun()
                     with col2:
                         if st.button("🗑 Delete"):
@@ -193,11 +183,6 @@ def render_calendar(client):
                             st.session_state.hide_event_editor = True
                             del st.session_state.editing_event
                             save_user_events(client.email, st.session_state.calendar_events)
-                            st.session_state.current_user = get_user({
-                                "email": st.user.email,
-                                "name": st.user.name,
-                                "role": 'client' # only used to validate coaches, null falls back to client
-                            })
                             st.rerun()
                     with col3:
                         if st.button("✖️ Cancel"):
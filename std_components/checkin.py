@@ -2,8 +2,12 @@ import datetime
 import streamlit as st
 
 
-from utils.db import add_checkin_context_entry, get_llm_context
-from utils.llm import llm_async
+from utils.exchanges import save_exchange
+from utils.chat import ChatSession
+from utils.prefetch import (
+    CHECKIN_OPENER, checkin_system_prompt, get_todays_goals, open_prefetched_session,
+    prefetch_checkin_questions,
+)
 
 
 
@@ -12,27 +16,13 @@ def render_checkin(client):
 
     plan = st.session_state.current_plan
     today = datetime.datetime.now().date()
-    events = plan.events or []
-
-    todays_goals = []
-    for event in events:
-        try:
-            event_start = datetime.datetime.fromisoformat(event.start)
-            event_end = datetime.datetime.fromisoformat(event.end)
-        except ValueError:
-            continue
-
-        if event_start.date() == today:
-            goal = plan.goals.get(event.id)
-            if goal:
-                todays_goals.append({
-                    "id": goal.id,
-                    "title": goal.title,
-                    "task": goal.task,
-                    "importance": goal.importance,
-                    "start": event_start.strftime("%I:%M %p"),
-                    "end": event_end.strftime("%I:%M %p")
-                })
+    todays_goals = get_todays_goals(plan, today)
+
+    # Have opening questions ready before the client opens a chat (once per day per session)
+    prefetch_key = f"checkin_prefetch_{today.isoformat()}"
+    if todays_goals and not st.session_state.get(prefetch_key):
+        prefetch_checkin_questions(client.email, plan, today)
+        st.session_state[prefetch_key] = True
 
     if not todays_goals:
         st.info("You have no scheduled goals for today.")
@@ -76,34 +66,28 @@ def render_checkin(client):
                 input_key = f"input_{goal['id']}"
                 send_key = f"send_{goal['id']}"
                 init_key = f"init_chat_{goal['id']}"
+                session_key = f"chat_session_{goal['id']}"
 
                 # Initialize chat history and system prompt
                 if history_key not in st.session_state:
                     st.session_state[history_key] = []
 
-                # On first open, run LLM to generate questions based on goal/task
+                # On first open, use the prefetched questions or start the session and run LLM to generate them
                 if not st.session_state.get(init_key):
-                    day_plan = f"{goal['title']} — {goal['task']}"
-                    full_context = get_llm_context(client.email)
-
-                    goal_prompt = f"""
-                    You are running a daily AI check-in with a client.
-
-                    Client Goal: {goal['title']}
-                    Today's Plan: {day_plan}
-
-                    Context from the client’s ongoing goals and progress:
-                    {full_context}
-
-                    Ask 2–3 reflective questions based on today's goal *and* their broader progress.
-                    Be specific, supportive, and concise.
-                    """
-
-                    with st.spinner("Coach is preparing your check-in questions..."):
-                        response = llm_async(goal_prompt, None)
-                        question_text = str(response).strip() if not hasattr(response, 'output') else response.output.strip()
-                    st.session_state[history_key].append(("Coach", question_text))
-                    st.session_state[init_key] = True
+                    prefetched = open_prefetched_session(client.email, goal["id"], today)
+                    if prefetched is not None:
+                        st.session_state[session_key], question_text = prefetched
+                        st.session_state[history_key].append(("Coach", question_text))
+                        st.session_state[init_key] = True
+                    else:
+                        session = st.session_state[session_key] = ChatSession(checkin_system_prompt(client.email, goal))
+
+                        # Stream the questions in, then rerun so they render with the history
+                        st.markdown("**Coach:**")
+                        question_text = st.write_stream(session.stream(CHECKIN_OPENER, site="checkin.questions")).strip()
+                        st.session_state[history_key].append(("Coach", question_text))
+                        st.session_state[init_key] = True
+                        st.rerun()
 
                 # Display existing messages
                 for sender, message in st.session_state[history_key]:
@@ -127,27 +111,15 @@ def render_checkin(client):
                     # Add user response
                     st.session_state[history_key].append(("You", pending_msg))
 
-                    full_context = get_llm_context(client.email)
-
-                    # Generate LLM feedback
-                    feedback_prompt = f"""
-                    The client is working on the goal: {goal['title']}
-                    Task: {goal['task']}
-
-                    Context from the client’s goal history:
-                    {full_context}
-
-                    They answered their check-in with:
-                    "{pending_msg}"
-
-                    Reflect supportively. Give 1 encouragement based on their effort and 1 actionable suggestion based on their broader progress.
-                    """
+                    st.markdown(f"**You:** {pending_msg}")
+                    st.markdown("**Coach:**")
+                    # Only the new message is sent; the session holds the goal context and earlier turns
+                    reply_text = st.write_stream(st.session_state[session_key].stream(pending_msg, site="checkin.feedback")).strip()
+                    st.session_state[history_key].append(("Coach", reply_text))
 
-                    with st.spinner("Coach is thinking..."):
-                        reply = llm_async(feedback_prompt, None)
-                        reply_text = str(reply).strip() if not hasattr(reply, 'output') else reply.output.strip()
-                        st.session_state[history_key].append(("Coach", reply_text))
-                        add_checkin_context_entry(
+                    # Persist only once the full reply has streamed in, and never a fallback reply
+                    if st.session_state[session_key].last_turn_ok:
+                        save_exchange(
                             user_email=client.email,
                             goal_id=goal["id"],
                             goal_type="coach",  # or "main" if needed
@@ -1,58 +1,145 @@
 import streamlit as st
 
-from utils.utils import load_file, convert_goals
-from utils.db import get_user, new_user_goals, update_user_goals
+from utils.utils import load_file, run_async
+from utils import db_async
+from utils.db import (
+    get_client, get_clients, update_user_goals, list_clients, assign_client,
+    watch_user,
+)
+from utils.jobs import DONE, FAILED, list_jobs, submit_bulk_plan_job, submit_plan_job
+from utils.plans import parse_bulk_upload
 
 from std_components.goals_display import render_goals
-from utils.models import GoalsLiteOnly, Plan, Goal
-from utils.llm import llm_async
+from utils.models import Goal
+
+# How often the plan job panel polls for progress while a job is running
+JOB_POLL_SECONDS = 3
+
+
+def _show_plan_jobs(jobs) -> bool:
+    """
+    Draw the job panel. Returns True if a job finished since it was last shown.
+    """
+    seen = st.session_state.setdefault("finished_plan_jobs", set())
+    newly_done = False
+
+    with st.expander("⏳ Plan Generation", expanded=any(job.active for job in jobs)):
+        for job in jobs:
+            label = f"{job.label} · {job.num_days} days — {job.stage}"
+            if job.status == FAILED:
+                st.error(f"{label}: {job.error}")
+            elif job.status == DONE:
+                st.success(label)
+            else:
+                st.progress(job.progress, text=label)
+
+            if job.results:
+                st.dataframe(
+                    [{"Client": r.client_email, "Saved": "✅" if r.ok else "❌", "Details": r.detail} for r in job.results],
+                    hide_index=True, use_container_width=True,
+                )
+
+            if job.status == DONE and job.id not in seen:
+                seen.add(job.id)
+                newly_done = True
+    return newly_done
+
+
+@st.fragment(run_every=JOB_POLL_SECONDS)
+def _poll_plan_jobs(coach_email):
+    jobs = list_jobs(coach_email)
+    # Redraw the page so a freshly saved plan shows up below, and so the panel
+    # stops polling once nothing is running
+    if _show_plan_jobs(jobs) or not any(job.active for job in jobs):
+        st.rerun()
+
+
+def render_plan_jobs(coach_email):
+    jobs = list_jobs(coach_email)
+    if any(job.active for job in jobs):
+        _poll_plan_jobs(coach_email)
+    elif jobs:
+        _show_plan_jobs(jobs)
 
 def render_coach(user, coach_clients):
     st.title("🧑‍🏫 Coach Dashboard")
 
+    with st.expander("➕ Add Client", expanded=not coach_clients):
+        with st.form(key="add_client_form", clear_on_submit=True):
+            client_email = st.text_input("Client email")
+            if st.form_submit_button("Add Client"):
+                if assign_client(user.email, client_email.strip()):
+                    st.session_state.all_clients, st.session_state.clients_cursor = list_clients(user.email)
+                    st.success(f"{client_email} added to your clients.")
+                    st.rerun()
+                else:
+                    st.error("No unassigned client account found for that email.")
+
     if not coach_clients:
-        st.warning("You have no clients yet. Ask your client to make an account.")
+        st.warning("You have no clients yet. Ask your client to make an account, then add them by email.")
         return  # Exit early to avoid rendering the rest
 
+    client_emails = [c.email for c in coach_clients]
+
+    with st.expander("👥 Client Overview"):
+        # All loaded clients are fetched together in one batched read
+        if st.button("Load overview", key="load_client_overview"):
+            overview = get_clients(user.email, client_emails)
+            st.session_state.client_overview = [
+                {
+                    "Client": c.name,
+                    "Email": c.email,
+                    "Plan version": c.currentPlanVersion or 0,
+                    "Goals": len(c.currentPlan.goals or {}) if c.currentPlan else 0,
+                    "Scheduled": len(c.currentPlan.events or []) if c.currentPlan else 0,
+                    "Main goals": len(c.main_goals or {}),
+                }
+                for c in overview.values()
+            ]
+
+        if st.session_state.get("client_overview"):
+            st.dataframe(st.session_state.client_overview, hide_index=True, use_container_width=True)
+
     st.subheader("📥 Upload Coaching Summary for Client")
-    client_emails = [c["email"] for c in coach_clients]
 
     selected_client = st.selectbox("Select a client", options=client_emails)
+    if st.session_state.get("clients_cursor"):
+        if st.button("Load more clients"):
+            more_clients, st.session_state.clients_cursor = list_clients(user.email, cursor=st.session_state.clients_cursor)
+            coach_clients.extend(more_clients)
+            st.rerun()
     num_days = st.number_input("How many days should the plan last?", min_value=1, max_value=30, value=14, step=1)
     summary = st.text_area("Paste session summary:", value=load_file("sample_transcript.txt"))
 
-    if st.button("Generate 2-Week Plan"):
-        with st.spinner("Generating..."):
-            prompt = f"""
-            You are a personal AI assistant helping a coach design a {num_days}-day improvement plan for a client.
-
-            Based on the following coaching session summary, identify 5 distinct goals the client should work on, and label each with an importance level: 
-            - 1 high importance goal
-            - 2 medium importance goals
-            - 2 low importance goals
-
-            Each goal should include a short, clear title and an actionable task (reflection, exercise, behavior, etc.).
-
+    fresh_plan = st.checkbox("Generate a fresh plan (ignore cached results)", value=False)
 
-            SESSION SUMMARY:
-            {summary}
-            """
-            goals = convert_goals(llm_async(prompt, GoalsLiteOnly).output)
-
-
-            plan = Plan()
-            plan.goals = goals
-            
-            new_user_goals(
-                selected_client,
-                {
-                    **plan.model_dump()
-                }
-            )
-
-            st.success(f"✅ Plan created and saved for {selected_client}")
+    if st.button("Generate 2-Week Plan"):
+        # Runs in the background; the coach can queue more clients meanwhile
+        submit_plan_job(user.email, selected_client, summary, num_days, use_cache=not fresh_plan)
+        st.toast(f"Queued a new plan for {selected_client}")
+
+    with st.expander("📦 Bulk Plan Generation"):
+        st.caption(
+            "Upload a JSONL file with one `{\"client\": ..., \"transcript\": ...}` object per line, "
+            "or a zip of `<client email>.txt` transcripts."
+        )
+        with st.form(key="bulk_plan_form", clear_on_submit=True):
+            upload = st.file_uploader("Session summaries", type=["jsonl", "zip"])
+            bulk_days = st.number_input("Plan length (days)", min_value=1, max_value=30, value=14, step=1)
+            bulk_fresh = st.checkbox("Ignore cached results", value=False)
+            if st.form_submit_button("Generate plans") and upload is not None:
+                try:
+                    items = parse_bulk_upload(upload.name, upload.getvalue())
+                except ValueError as e:
+                    st.error(str(e))
+                else:
+                    if items:
+                        submit_bulk_plan_job(user.email, items, bulk_days, use_cache=not bulk_fresh)
+                        st.toast(f"Queued plans for {len(items)} clients")
+                    else:
+                        st.warning("No client transcripts found in that file.")
 
-            st.subheader("📅 Generated 2-Week Plan")
+    render_plan_jobs(user.email)
 
     st.divider()
     st.subheader(f"📋 Current Plan for {selected_client}")
@@ -72,9 +159,9 @@ def render_coach(user, coach_clients):
                 else:
 
                     new_goal = Goal(title=new_title, task=new_task, importance=new_importance)
-                    full_client = get_user({"email": selected_client, "name": st.user.name, "role": "client"})
+                    full_client = get_client(user.email, selected_client)
 
-                    if not full_client.currentPlan:
+                    if full_client is None or not full_client.currentPlan:
                         st.error("User has no existing plan. Generate a plan first.")
                     else:
                         current_goals = full_client.currentPlan.goals or {}
@@ -86,8 +173,32 @@ def render_coach(user, coach_clients):
             elif cancel:
                 st.info("Goal creation cancelled.")
 
-    client = get_user({"email": selected_client, "name": st.user.name, "role": "client"})
-    if client.currentPlan:
+    # Serve the selected client from a live copy instead of re-reading it each rerun
+    watch_user(selected_client)
+    history_key = f"plan_history_{selected_client}"
+    load_history_key = f"load_{history_key}"
+
+    # History is only fetched once the coach asks for it, alongside the client read
+    reads = [db_async.get_client(user.email, selected_client)]
+    if st.session_state.get(load_history_key):
+        reads.append(db_async.get_plan_history(selected_client))
+    client, *history = run_async(db_async.gather(*reads))
+    if history:
+        st.session_state[history_key] = history[0]
+
+    if client is None:
+        st.error(f"{selected_client} is no longer assigned to you.")
+    elif client.currentPlan:
         render_goals(client, user)
     else:
         st.info(f"No plan uploaded yet for {selected_client}.")
+
+    if client is not None and client.currentPlanVersion:
+        with st.expander("🕘 Plan History"):
+            st.button("Load plan history", key=load_history_key)
+
+            for past_plan in st.session_state.get(history_key, []):
+                label = past_plan.get("timestamp") or "before versioning"
+                st.markdown(f"**Version {past_plan['version']}** — {label}")
+                for goal in (past_plan.get("goals") or {}).values():
+                    st.markdown(f"- *{goal['importance']}* · {goal['title']}")
@@ -1,7 +1,9 @@
 import streamlit as st
 from utils.models import Goal
-from utils.db import add_main_goal, edit_main_goal, delete_main_goal, get_llm_context
-from utils.llm import llm_async
+from utils.db import add_main_goal, edit_main_goal, delete_main_goal
+from utils.exchanges import save_exchange
+from utils.context import get_prompt_context
+from utils.chat import ChatSession
 
 def render_maingoal(user):
     st.subheader("🎯 Main Goals")
@@ -29,9 +31,13 @@ def render_maingoal(user):
                                 task=edited_task,
                                 importance="mainGoal"
                             )
-                            edit_main_goal(user.email, updated_goal)
-                            user.main_goals[goal_id] = updated_goal
-                            st.success("Main goal updated.")
+                            if edit_main_goal(user.email, updated_goal):
+                                user.main_goals[goal_id] = updated_goal
+                                st.success("Main goal updated.")
+                            else:
+                                # Deleted from another session meanwhile
+                                user.main_goals.pop(goal_id, None)
+                                st.warning("This main goal no longer exists.")
                             st.rerun()
 
                 with col2:
@@ -54,12 +60,13 @@ def render_maingoal(user):
                         input_key = f"input_main_{goal_id}"
                         send_key = f"send_main_{goal_id}"
                         init_key = f"init_chat_main_{goal_id}"
+                        session_key = f"chat_session_main_{goal_id}"
 
                         if history_key not in st.session_state:
                             st.session_state[history_key] = []
 
                         if not st.session_state.get(init_key):
-                            full_context = get_llm_context(user.email)
+                            full_context = get_prompt_context(user.email, goal.id, query=f"{goal.title} {goal.task}").text
 
                             system_prompt = f"""
                             You are the AI coach guiding a client on their long-term main goal.
@@ -70,15 +77,20 @@ def render_maingoal(user):
                             Context from all other goals and check-ins:
                             {full_context}
 
-                            Ask 2–3 focused reflective questions to help the client assess and deepen their progress toward this main goal.
-                            Be concise, motivational, and specific.
+                            When the client responds, provide 1 thoughtful encouragement and 1 practical next step
+                            they could take, grounded in their broader goal progress.
                             """
-
-                            with st.spinner("Coach is preparing your reflection questions..."):
-                                response = llm_async(system_prompt, None)
-                                question_text = str(response).strip() if not hasattr(response, 'output') else response.output.strip()
+                            session = st.session_state[session_key] = ChatSession(system_prompt)
+
+                            st.markdown("**Coach:**")
+                            question_text = st.write_stream(session.stream(
+                                "Ask 2–3 focused reflective questions to help the client assess and deepen their progress "
+                                "toward this main goal. Be concise, motivational, and specific.",
+                                site="main_goal.questions",
+                            )).strip()
                             st.session_state[history_key].append(("Coach", question_text))
                             st.session_state[init_key] = True
+                            st.rerun()
 
                         for sender, message in st.session_state[history_key]:
                             st.markdown(f"**{sender}:** {message}")
@@ -95,34 +107,19 @@ def render_maingoal(user):
 
                             st.session_state[history_key].append(("You", pending_msg))
 
-                            full_context = get_llm_context(user)
-
-                            feedback_prompt = f"""
-                            The client is working on their main goal:
-                            {goal.title} — {goal.task}
-
-                            Context from other goals:
-                            {full_context}
-
-                            Their response was:
-                            "{pending_msg}"
-
-                            Provide 1 thoughtful encouragement and 1 practical next step they could take, grounded in their broader goal progress.
-                            """
+                            st.markdown(f"**You:** {pending_msg}")
+                            st.markdown("**Coach:**")
+                            reply_text = st.write_stream(st.session_state[session_key].stream(pending_msg, site="main_goal.feedback")).strip()
+                            st.session_state[history_key].append(("Coach", reply_text))
 
-                            with st.spinner("Coach is thinking..."):
-                                reply = llm_async(feedback_prompt, None)
-                                reply_text = str(reply).strip() if not hasattr(reply, 'output') else reply.output.strip()
-                                st.session_state[history_key].append(("Coach", reply_text))
-
-                            from utils.db import add_checkin_context_entry
-                            add_checkin_context_entry(
-                                user_email=user.email,
-                                goal_id=goal.id,
-                                goal_type="main",
-                                user_msg=pending_msg,
-                                coach_msg=reply_text
-                            )
+                            if st.session_state[session_key].last_turn_ok:
+                                save_exchange(
+                                    user_email=user.email,
+                                    goal_id=goal.id,
+                                    goal_type="main",
+                                    user_msg=pending_msg,
+                                    coach_msg=reply_text
+                                )
 
                             st.rerun()
     else:
@@ -144,13 +141,14 @@ def render_maingoal(user):
                     task=new_task,
                     importance="mainGoal"
                 )
-                add_main_goal(user.email, new_goal)
-
-                if user.main_goals is None:
-                    user.main_goals = {}
-                user.main_goals[new_goal.id] = new_goal
-
-                st.success("Main goal added successfully.")
-                st.rerun()
+                if add_main_goal(user.email, new_goal):
+                    if user.main_goals is None:
+                        user.main_goals = {}
+                    user.main_goals[new_goal.id] = new_goal
+
+                    st.success("Main goal added successfully.")
+                    st.rerun()
+                else:
+                    st.error("A main goal with this title and task already exists.")
             else:
                 st.error("Please fill in both the title and task.")
@@ -0,0 +1,21 @@
+import os
+import sys
+import tempfile
+
+# Run everything offline: the in-memory store, the fake model and local
+# embeddings, with caches and metrics kept out of the working tree. Set
+# before any utils module is imported, since they read these at import time.
+_tmp = tempfile.mkdtemp(prefix="coachai-tests-")
+os.environ.update({
+    "STORAGE_BACKEND": "memory",
+    "LLM_BACKEND": "fake",
+    "EMBEDDING_BACKEND": "hashing",
+    "LLM_FAKE_LATENCY": "0",
+    "LLM_FAKE_CHUNK_DELAY": "0",
+    "LLM_CACHE_PATH": os.path.join(_tmp, "llm_cache.sqlite"),
+    "LLM_METRICS_PATH": os.path.join(_tmp, "llm_metrics.jsonl"),
+})
+os.environ.pop("GOOGLE_API_KEY", None)
+os.environ.pop("STORAGE_SEED", None)
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,40 @@
+from utils.context import MIN_RETRIEVAL_SCORE, build_context
+
+USER_DATA = {
+    "currentPlan": {"goals": {
+        "sleep": {"title": "Sleep routine"},
+        "walk": {"title": "Daily walk"},
+    }},
+    "coach_goal_context": {"sleep": "User: slept well\nCoach: great"},
+}
+
+
+def _snippet(goal_id, text, timestamp, score=0.9):
+    return {"goal_id": goal_id, "text": text, "timestamp": timestamp, "score": score}
+
+
+def _retrieved(context):
+    return context.text.split("RELEVANT EARLIER CHECK-INS:\n", 1)[1].splitlines()
+
+
+def test_retrieved_exchanges_are_grouped_by_goal_in_chronological_order():
+    snippets = [
+        _snippet("walk", "User: walked twice", "2025-03-02", score=0.95),
+        _snippet("sleep", "User: late night", "2025-03-03", score=0.9),
+        _snippet("walk", "User: skipped the walk", "2025-03-01", score=0.5),
+    ]
+    context = build_context(USER_DATA, "sleep", "walk", budget=1000, snippets=snippets)
+    assert _retrieved(context) == [
+        "- Sleep routine:", "User: late night",
+        "- Daily walk:", "User: skipped the walk", "User: walked twice",
+    ]
+
+
+def test_retrieved_exchanges_below_min_score_or_for_removed_goals_are_dropped():
+    snippets = [
+        _snippet("walk", "User: unrelated", "2025-03-01", score=MIN_RETRIEVAL_SCORE / 2),
+        _snippet("old-goal", "User: from an old plan", "2025-03-02"),
+    ]
+    context = build_context(USER_DATA, "sleep", "walk", budget=1000, snippets=snippets)
+    assert "RELEVANT EARLIER CHECK-INS" not in context.text
+    assert "Untitled Goal" not in context.text
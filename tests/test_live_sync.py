@@ -0,0 +1,29 @@
+import threading
+
+from utils import db
+
+
+def _wait_for_version(email: str, version: int) -> bool:
+    changed = threading.Event()
+    unsubscribe = db.subscribe_user(email, lambda _: changed.set())
+    try:
+        return db.get_user_version(email) >= version or changed.wait(timeout=5)
+    finally:
+        unsubscribe()
+
+
+def test_own_write_bumps_the_version_once_and_outside_writes_are_picked_up():
+    email = "live@example.com"
+    db.create_user({"email": email, "name": "Live", "role": "client"})
+    db.watch_user(email)
+    assert _wait_for_version(email, 1)
+    start = db.get_user_version(email)
+
+    # Replayed locally, then echoed back by the listener
+    db.save_user_events(email, [])
+    threading.Event().wait(0.2)
+    assert db.get_user_version(email) == start + 1
+
+    db.get_db().document(f"users/{email}").update({"name": "Changed"})
+    assert _wait_for_version(email, start + 2)
+    assert db.get_user_data(email)["name"] == "Changed"
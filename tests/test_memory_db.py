@@ -0,0 +1,192 @@
+import threading
+
+import pytest
+from google.api_core.exceptions import NotFound
+from google.cloud.firestore_v1 import transforms
+from google.cloud.firestore_v1.base_query import FieldFilter
+
+from utils.memory_db import MemoryClient, memory_transactional
+
+
+@pytest.fixture
+def client():
+    return MemoryClient({
+        "users/a": {"role": "client", "age": 30, "name": "Ann", "plan": {"x": 1, "y": 2}},
+        "users/b": {"role": "coach", "age": 40, "name": "Bob"},
+        "users/c": {"role": "client", "age": 25, "name": "Cat"},
+        "users/d": {"role": "client", "name": "Dan"},
+        "users/a/checkins/1": {"n": 1},
+    })
+
+
+def _ids(snapshots):
+    return [snapshot.id for snapshot in snapshots]
+
+
+def test_where_filters_on_field(client):
+    query = client.collection("users").where(filter=FieldFilter("role", "==", "client"))
+    assert sorted(_ids(query.get())) == ["a", "c", "d"]
+    assert _ids(client.collection("users").where("age", ">", 28).order_by("age").get()) == ["a", "b"]
+
+
+def test_query_only_sees_its_own_collection(client):
+    assert _ids(client.collection("users/a/checkins").get()) == ["1"]
+    assert "1" not in _ids(client.collection("users").get())
+
+
+def test_order_by_skips_documents_without_the_field(client):
+    assert _ids(client.collection("users").order_by("age").get()) == ["c", "a", "b"]
+    assert _ids(client.collection("users").order_by("age", direction="DESCENDING").get()) == ["b", "a", "c"]
+
+
+def test_start_after_and_limit_page_through_results(client):
+    query = client.collection("users").order_by("name").limit(2)
+    first = query.get()
+    assert _ids(first) == ["a", "b"]
+    assert _ids(query.start_after(first[-1]).get()) == ["c", "d"]
+    assert _ids(query.start_after({"name": "Bob"}).get()) == ["c", "d"]
+
+
+def test_select_projects_fields(client):
+    snapshot = client.collection("users").where("name", "==", "Ann").select(["plan.x", "role"]).get()[0]
+    assert snapshot.to_dict() == {"plan": {"x": 1}, "role": "client"}
+
+
+def test_get_field_paths_projects_fields(client):
+    assert client.document("users/a").get(field_paths=["name"]).to_dict() == {"name": "Ann"}
+
+
+def test_set_merge_field_paths_replaces_only_those_fields(client):
+    ref = client.document("users/a")
+    ref.set({"plan": {"x": 5}, "name": "ignored"}, merge=["plan"])
+    assert ref.get().to_dict() == {"role": "client", "age": 30, "name": "Ann", "plan": {"x": 5}}
+
+
+def test_set_merge_true_deep_merges(client):
+    ref = client.document("users/a")
+    ref.set({"plan": {"x": 5}}, merge=True)
+    assert ref.get().to_dict()["plan"] == {"x": 5, "y": 2}
+
+
+def test_set_merge_missing_field_path_raises(client):
+    with pytest.raises(ValueError):
+        client.document("users/a").set({"name": "Ann"}, merge=["plan"])
+
+
+def test_update_dotted_paths_and_transforms(client):
+    ref = client.document("users/a")
+    ref.update({"plan.y": transforms.DELETE_FIELD, "age": transforms.Increment(1),
+                "tags": transforms.ArrayUnion(["a", "b"])})
+    data = ref.get().to_dict()
+    assert data["plan"] == {"x": 1}
+    assert data["age"] == 31
+    assert data["tags"] == ["a", "b"]
+
+
+def test_update_missing_document_raises(client):
+    with pytest.raises(NotFound):
+        client.document("users/z").update({"name": "Zed"})
+
+
+def test_batch_applies_all_writes(client):
+    batch = client.batch()
+    batch.set(client.document("users/e"), {"name": "Eve"})
+    batch.update(client.document("users/a"), {"age": 31})
+    batch.delete(client.document("users/b"))
+    batch.commit()
+    assert client.document("users/e").get().exists
+    assert client.document("users/a").get().get("age") == 31
+    assert not client.document("users/b").get().exists
+
+
+def test_batch_with_failing_write_leaves_no_partial_writes(client):
+    before = client.dump()
+    batch = client.batch()
+    batch.set(client.document("users/e"), {"name": "Eve"})
+    batch.update(client.document("users/a"), {"age": 31})
+    batch.update(client.document("users/z"), {"name": "Zed"})
+    with pytest.raises(NotFound):
+        batch.commit()
+    assert client.dump() == before
+
+
+def test_batch_rolls_back_when_a_write_fails_part_way(client):
+    before = client.dump()
+    batch = client.batch()
+    batch.update(client.document("users/a"), {"age": 31})
+    batch.set(client.document("users/c"), {"name": "Cat"}, merge=["missing"])
+    with pytest.raises(ValueError):
+        batch.commit()
+    assert client.dump() == before
+
+
+def test_update_after_set_in_same_batch_is_valid(client):
+    batch = client.batch()
+    batch.set(client.document("users/e"), {"name": "Eve"})
+    batch.update(client.document("users/e"), {"age": 20})
+    batch.commit()
+    assert client.document("users/e").get().to_dict() == {"name": "Eve", "age": 20}
+
+
+def test_transaction_applies_writes_on_return(client):
+    @memory_transactional
+    def rename(transaction, ref):
+        name = ref.get(transaction=transaction).get("name")
+        transaction.update(ref, {"name": name + "!"})
+
+    rename(client.transaction(), client.document("users/a"))
+    assert client.document("users/a").get().get("name") == "Ann!"
+
+
+def test_transaction_that_raises_writes_nothing(client):
+    @memory_transactional
+    def fail(transaction, ref):
+        transaction.update(ref, {"name": "changed"})
+        raise RuntimeError("abort")
+
+    with pytest.raises(RuntimeError):
+        fail(client.transaction(), client.document("users/a"))
+    assert client.document("users/a").get().get("name") == "Ann"
+
+
+def test_concurrent_transactional_appends_all_survive(client):
+    ref = client.document("users/a")
+
+    @memory_transactional
+    def append(transaction, value):
+        items = ref.get(transaction=transaction).to_dict().get("items", [])
+        transaction.update(ref, {"items": items + [value]})
+
+    threads = [threading.Thread(target=append, args=(client.transaction(), i)) for i in range(20)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert sorted(ref.get().get("items")) == list(range(20))
+
+
+def test_on_snapshot_fires_initially_and_after_writes(client):
+    seen = []
+    events = threading.Semaphore(0)
+
+    def callback(docs, changes, read_time):
+        seen.append(docs[0].to_dict().get("name"))
+        events.release()
+
+    watch = client.document("users/a").on_snapshot(callback)
+    assert events.acquire(timeout=5)
+    client.document("users/a").update({"name": "Anna"})
+    assert events.acquire(timeout=5)
+    assert seen == ["Ann", "Anna"]
+
+    watch.unsubscribe()
+    client.document("users/a").update({"name": "Annie"})
+    assert not events.acquire(timeout=0.2)
+
+
+def test_on_snapshot_ignores_other_documents(client):
+    events = threading.Semaphore(0)
+    client.document("users/a").on_snapshot(lambda docs, changes, read_time: events.release())
+    assert events.acquire(timeout=5)
+    client.document("users/b").update({"name": "Bobby"})
+    assert not events.acquire(timeout=0.2)
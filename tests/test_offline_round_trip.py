@@ -0,0 +1,48 @@
+import datetime
+
+from utils.chat import ChatSession
+from utils.db import (
+    create_user, get_goal_context, get_user, new_user_goals, save_user_events,
+)
+from utils.exchanges import save_exchange
+from utils.llm import LLM_BACKEND
+from utils.plans import generate_plan
+from utils.prefetch import CHECKIN_OPENER, checkin_system_prompt, get_todays_goals
+from utils.storage import STORAGE_BACKEND
+from utils.vector_index import search_exchanges
+
+
+def test_goal_plan_checkin_round_trip():
+    assert (STORAGE_BACKEND, LLM_BACKEND) == ("memory", "fake")
+    email = "client@example.com"
+    create_user({"email": email, "name": "Client", "role": "client"})
+
+    plan = generate_plan("We talked about sleep, focus and exercise.", 7)
+    assert sorted(goal.importance for goal in plan.goals.values()) == ["high", "low", "low", "medium", "medium"]
+    new_user_goals(email, plan.model_dump())
+
+    today = datetime.date.today()
+    start = datetime.datetime.combine(today, datetime.time(9))
+    goal = next(iter(plan.goals.values()))
+    save_user_events(email, [{
+        "id": goal.id, "title": goal.title,
+        "start": start.isoformat(), "end": (start + datetime.timedelta(hours=1)).isoformat(),
+        "extendedProps": {"importance": goal.importance},
+    }])
+
+    user = get_user({"email": email})
+    assert user.currentPlanVersion == 1
+    todays_goals = get_todays_goals(user.currentPlan, today)
+    assert [g["id"] for g in todays_goals] == [goal.id]
+
+    session = ChatSession(checkin_system_prompt(email, todays_goals[0]))
+    questions = "".join(session.stream(CHECKIN_OPENER, site="checkin.questions"))
+    assert questions and session.last_turn_ok
+
+    reply = "".join(session.stream("I went to bed on time twice.", site="checkin.feedback"))
+    assert reply and session.last_turn_ok
+    assert len(session.messages) == 4
+
+    save_exchange(email, goal.id, "coach", "I went to bed on time twice.", reply)
+    assert "I went to bed on time twice." in get_goal_context(email, goal.id, "coach")
+    assert search_exchanges(email, "bed on time")[0]["goal_id"] == goal.id
@@ -0,0 +1,31 @@
+import datetime
+
+from utils.db import create_user, get_prefetched_questions, new_user_goals
+from utils.prefetch import prefetch_all_checkin_questions
+
+
+def _plan(today: datetime.date, goal_ids):
+    start = datetime.datetime.combine(today, datetime.time(9)).isoformat()
+    return {
+        "goals": {gid: {"id": gid, "title": f"Goal {gid}", "task": "Do it", "importance": "medium"}
+                  for gid in goal_ids},
+        "events": [{"id": gid, "title": f"Goal {gid}", "start": start, "end": start,
+                    "extendedProps": {"importance": "medium"}} for gid in goal_ids],
+    }
+
+
+def test_prefetch_all_stores_questions_for_every_client_once():
+    today = datetime.date.today()
+    emails = [f"prefetch{i}@example.com" for i in range(3)]
+    for email in emails:
+        create_user({"email": email, "name": email, "role": "client"})
+        new_user_goals(email, _plan(today, ["a", "b"]))
+    create_user({"email": "prefetch-coach@example.com", "name": "Coach", "role": "coach"})
+
+    assert prefetch_all_checkin_questions(today) >= 6
+    for email in emails:
+        stored = get_prefetched_questions(email, today.isoformat(), ["a", "b"])
+        assert set(stored) == {"a", "b"}
+        assert "Goal a" in stored["a"]["system_prompt"]
+
+    assert prefetch_all_checkin_questions(today) == 0
@@ -0,0 +1,24 @@
+import json
+
+from utils import telemetry
+
+
+def test_metrics_sink_is_written_in_the_background_and_rotated(tmp_path, monkeypatch):
+    path = tmp_path / "calls.jsonl"
+    monkeypatch.setattr(telemetry, "LLM_METRICS_PATH", str(path))
+    monkeypatch.setattr(telemetry, "LLM_METRICS_MAX_BYTES", 1000)
+    monkeypatch.setattr(telemetry, "LLM_METRICS_BACKUPS", 2)
+    monkeypatch.setattr(telemetry, "_sink", None)
+    monkeypatch.setattr(telemetry, "_sink_listener", None)
+
+    for i in range(50):
+        with telemetry.track_llm_call(f"test.{i}", "fake"):
+            pass
+    telemetry._close_sink()
+
+    files = sorted(tmp_path.iterdir())
+    assert [f.name for f in files] == ["calls.jsonl", "calls.jsonl.1", "calls.jsonl.2"]
+    for f in files:
+        assert f.stat().st_size <= 1000
+    last = json.loads(path.read_text(encoding="utf-8").splitlines()[-1])
+    assert last["site"] == "test.49"
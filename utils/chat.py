@@ -0,0 +1,68 @@
+"""
+Multi-turn chat sessions for the check-in and main-goal chats.
+
+The goal and its budgeted context go in once as a system prompt; each turn
+then sends only the client's new message plus a bounded window of the
+conversation so far, kept as pydantic_ai messages in st.session_state.
+"""
+import os
+from dataclasses import dataclass, field
+from typing import Iterator, List
+
+from pydantic_ai.messages import (
+    ModelMessage, ModelRequest, ModelResponse, SystemPromptPart, TextPart, UserPromptPart,
+)
+
+from utils.llm import LLM_TIMEOUT, llm_stream
+
+# Most recent client/coach turns resent with each message
+CHAT_HISTORY_TURNS = int(os.getenv("CHAT_HISTORY_TURNS", 6))
+
+
+@dataclass
+class ChatSession:
+    system_prompt: str
+    messages: List[ModelMessage] = field(default_factory=list)
+    max_turns: int = CHAT_HISTORY_TURNS
+    # False while a reply streams, and after one that was a fallback rather than a model answer
+    last_turn_ok: bool = True
+
+    def history(self) -> List[ModelMessage]:
+        """
+        The system prompt followed by the newest `max_turns` turns.
+        """
+        window = self.messages[-2 * self.max_turns:] if self.max_turns else []
+        # Never start the window on a model response
+        while window and not isinstance(window[0], ModelRequest):
+            window = window[1:]
+        return [self.system_message(), *window]
+
+    def system_message(self) -> ModelRequest:
+        return ModelRequest(parts=[SystemPromptPart(self.system_prompt)])
+
+    def add_turn(self, user_msg: str, reply: str) -> None:
+        """
+        Record a turn whose reply was produced elsewhere (e.g. prefetched).
+        """
+        self._append([ModelRequest(parts=[UserPromptPart(user_msg)]), ModelResponse(parts=[TextPart(reply)])])
+
+    def _append(self, new_messages: List[ModelMessage]) -> None:
+        self.messages.extend(new_messages)
+        # Keep a little more than the window so trimming stays on turn boundaries
+        del self.messages[:-4 * max(self.max_turns, 1)]
+
+    def _complete(self, new_messages: List[ModelMessage]) -> None:
+        self._append(new_messages)
+        self.last_turn_ok = True
+
+    def stream(self, user_msg: str, site: str = "chat", timeout: float = LLM_TIMEOUT) -> Iterator[str]:
+        """
+        Send one message and yield the reply as it streams in. The turn is
+        added to the session only once the reply has completed; fallback
+        replies are shown but not added, and leave last_turn_ok False.
+        """
+        self.last_turn_ok = False
+        return llm_stream(
+            user_msg, timeout=timeout, site=site,
+            message_history=self.history(), on_complete=self._complete,
+        )
@@ -0,0 +1,96 @@
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Tuple
+
+from utils.db import get_goal_context, replace_goal_context_prefix
+from utils.llm import llm_async
+
+# Compact a goal's context once it grows past this many characters,
+# keeping the newest CONTEXT_KEEP_EXCHANGES exchanges verbatim.
+CONTEXT_COMPACT_THRESHOLD = 6000
+CONTEXT_KEEP_EXCHANGES = 4
+SUMMARY_MAX_WORDS = 150
+
+SUMMARY_PREFIX = "Summary of earlier check-ins:"
+
+# Exchanges are stored as "User: ...\nCoach: ..." blocks separated by a blank line
+_EXCHANGE_BOUNDARY = re.compile(r"\n\n(?=User: )")
+
+_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="context-compaction")
+_pending = set()
+_pending_lock = threading.Lock()
+
+
+def split_context(context: str) -> Tuple[str, List[str]]:
+    """
+    Split a goal context string into its rolling summary and raw exchanges.
+    """
+    parts = _EXCHANGE_BOUNDARY.split(context) if context else []
+    summary = ""
+    if parts and parts[0].startswith(SUMMARY_PREFIX):
+        summary = parts.pop(0)[len(SUMMARY_PREFIX):].strip()
+    return summary, parts
+
+
+def compact_goal_context(user_email: str, goal_id: str, goal_type: str) -> bool:
+    """
+    Fold all but the newest exchanges of a goal's context into its rolling summary.
+
+    Returns True if the stored context was rewritten.
+    """
+    context = get_goal_context(user_email, goal_id, goal_type)
+    if len(context) <= CONTEXT_COMPACT_THRESHOLD:
+        return False
+
+    parts = _EXCHANGE_BOUNDARY.split(context)
+    summary, exchanges = split_context(context)
+    if len(exchanges) <= CONTEXT_KEEP_EXCHANGES:
+        return False
+
+    # Everything before the kept exchanges, exactly as stored
+    cut = len(parts) - CONTEXT_KEEP_EXCHANGES
+    old_prefix = "\n\n".join(parts[:cut]) + "\n\n"
+    older = "\n\n".join(exchanges[:-CONTEXT_KEEP_EXCHANGES])
+
+    prompt = f"""
+    You maintain a running summary of a client's coaching check-ins for one goal.
+
+    Existing summary:
+    {summary or "None yet."}
+
+    Older check-in exchanges to fold in:
+    {older}
+
+    Write an updated summary in at most {SUMMARY_MAX_WORDS} words. Keep concrete progress, obstacles,
+    commitments and anything the coach should follow up on. Do not invent details.
+    """
+    result = llm_async(prompt, None, site="compaction")
+    if getattr(result, "fallback", False):
+        return False  # never fold exchanges into a canned reply; retried on the next entry
+    new_summary = result.output.strip()
+
+    return replace_goal_context_prefix(
+        user_email, goal_id, goal_type,
+        old_prefix, f"{SUMMARY_PREFIX} {new_summary}\n\n"
+    )
+
+
+def _run_compaction(key: Tuple[str, str, str]) -> None:
+    try:
+        compact_goal_context(*key)
+    finally:
+        with _pending_lock:
+            _pending.discard(key)
+
+
+def schedule_compaction(user_email: str, goal_id: str, goal_type: str) -> None:
+    """
+    Queue a background compaction for a goal unless one is already pending.
+    """
+    key = (user_email, goal_id, goal_type)
+    with _pending_lock:
+        if key in _pending:
+            return
+        _pending.add(key)
+    _executor.submit(_run_compaction, key)
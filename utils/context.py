@@ -0,0 +1,201 @@
+"""
+Token-budgeted prompt context for the chat prompts.
+
+Each goal's stored context is broken into its rolling summary and individual
+exchanges, every piece is scored by relevance to the current goal and
+conversation plus recency, and the highest scoring pieces are packed into the
+budget. Pieces are kept or dropped whole, so the same inputs always produce
+the same context; the result is rendered back in the original goal and
+chronological order. Older exchanges retrieved from the semantic index (see
+utils/vector_index.py) compete for the same budget.
+"""
+import asyncio
+import math
+import os
+import re
+from dataclasses import dataclass
+from typing import List, Optional
+
+from utils import db_async
+from utils.compaction import SUMMARY_PREFIX, split_context
+from utils.utils import run_async
+from utils.vector_index import RETRIEVAL_TOP_K, search_exchanges
+
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", 1500))
+
+# Rough Gemini ratio for English text; close enough to cap prompt size
+CHARS_PER_TOKEN = 4
+
+CURRENT_GOAL_BOOST = 2.0
+RECENCY_DECAY = 0.5
+RETRIEVED_BASE_SCORE = 1.0
+# Retrieved exchanges less similar than this to the query are left out
+MIN_RETRIEVAL_SCORE = float(os.getenv("MIN_RETRIEVAL_SCORE", 0.2))
+
+_WORD = re.compile(r"[a-z0-9']{3,}")
+
+
+@dataclass
+class PromptContext:
+    text: str
+    tokens: int
+    budget: int
+    dropped: int = 0  # pieces left out to stay within the budget
+
+
+@dataclass
+class _Piece:
+    section: int  # 0 = main goals, 1 = coach goals, 2 = retrieved exchanges
+    goal_order: int
+    order: int  # position within the goal, oldest first
+    goal_id: str
+    text: str
+    score: float
+    tokens: int
+
+
+def estimate_tokens(text: str) -> int:
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+
+def _words(text: str) -> set:
+    return set(_WORD.findall(text.lower()))
+
+
+def _relevance(query_words: set, text: str) -> float:
+    """
+    Share of the query's words that appear in `text`.
+    """
+    if not query_words:
+        return 0.0
+    return len(query_words & _words(text)) / len(query_words)
+
+
+def _goal_pieces(section: int, goals: dict, contexts: dict, goal_id: Optional[str],
+                 query_words: set) -> List[_Piece]:
+    pieces = []
+    for goal_order, (gid, goal) in enumerate(goals.items()):
+        boost = CURRENT_GOAL_BOOST if gid == goal_id else 0.0
+        title = goal.get("title", "Untitled Goal")
+        summary, exchanges = split_context(contexts.get(gid, ""))
+
+        parts = []
+        if summary:
+            parts.append((f"{SUMMARY_PREFIX} {summary}", RECENCY_DECAY))
+        for age, exchange in enumerate(reversed(exchanges)):
+            parts.append((exchange, RECENCY_DECAY ** age))
+        if summary:
+            # The summary reads first but ranks like the second newest exchange
+            parts = [parts[0]] + list(reversed(parts[1:]))
+        else:
+            parts.reverse()
+
+        if not parts:
+            parts.append(("No summary available.", 0.0))
+
+        for order, (text, recency) in enumerate(parts):
+            score = boost + recency + _relevance(query_words, f"{title} {text}")
+            pieces.append(_Piece(section, goal_order, order, gid, text, score, estimate_tokens(f"{text}\n")))
+    return pieces
+
+
+def _retrieved_pieces(snippets: List[dict], goals: dict, seen: set, goal_id: Optional[str]) -> List[_Piece]:
+    """
+    Pieces for semantically retrieved exchanges not already in a goal's
+    context, for goals still in `goals` and at least MIN_RETRIEVAL_SCORE
+    similar to the query. They are grouped by goal and ordered oldest first.
+    """
+    goal_orders = {gid: goal_order for goal_order, gid in enumerate(goals)}
+    snippets = [
+        s for s in snippets
+        if s["goal_id"] in goal_orders and s["text"] not in seen and s.get("score", 0.0) >= MIN_RETRIEVAL_SCORE
+    ]
+
+    pieces = []
+    for order, snippet in enumerate(sorted(snippets, key=lambda s: s.get("timestamp") or "")):
+        text = snippet["text"]
+        boost = CURRENT_GOAL_BOOST if snippet["goal_id"] == goal_id else 0.0
+        score = boost + RETRIEVED_BASE_SCORE + snippet["score"]
+        pieces.append(_Piece(2, goal_orders[snippet["goal_id"]], order, snippet["goal_id"], text, score,
+                             estimate_tokens(f"{text}\n")))
+    return pieces
+
+
+def build_context(user_data: dict | None, goal_id: Optional[str] = None, query: str = "",
+                  budget: int = CONTEXT_TOKEN_BUDGET, snippets: Optional[List[dict]] = None) -> PromptContext:
+    """
+    Render the goal summaries that best fit `budget` tokens, favouring the
+    current goal, pieces that share words with `query` and recent exchanges.
+
+    `snippets` are retrieved exchanges (dicts with goal_id, text and score)
+    offered alongside the stored goal contexts.
+    """
+    user_data = user_data or {}
+    main_goals = user_data.get("main_goals") or {}
+    coach_goals = (user_data.get("currentPlan") or {}).get("goals") or {}
+    sections = [
+        (main_goals, "MAIN GOALS AND PROGRESS:"),
+        (coach_goals, "COACH GOALS AND PROGRESS:"),
+        ({**main_goals, **coach_goals}, "RELEVANT EARLIER CHECK-INS:"),
+    ]
+
+    query_words = _words(query)
+    pieces = _goal_pieces(0, main_goals, user_data.get("main_goal_context") or {}, goal_id, query_words)
+    pieces += _goal_pieces(1, coach_goals, user_data.get("coach_goal_context") or {}, goal_id, query_words)
+    pieces += _retrieved_pieces(snippets or [], sections[2][0], {p.text for p in pieces}, goal_id)
+    if not pieces:
+        text = "No goal progress available yet."
+        return PromptContext(text, estimate_tokens(text), budget)
+
+    # Greedily keep the best pieces, charging each goal and section header once
+    used = 0
+    kept = []
+    headers = set()
+    for piece in sorted(pieces, key=lambda p: (-p.score, p.section, p.goal_order, p.order)):
+        goal = sections[piece.section][0].get(piece.goal_id, {})
+        cost = piece.tokens
+        if piece.section not in headers:
+            cost += estimate_tokens(f"\n{sections[piece.section][1]}\n")
+        if (piece.section, piece.goal_id) not in headers:
+            cost += estimate_tokens(f"- {goal.get('title', 'Untitled Goal')}:\n")
+        if used + cost > budget:
+            continue
+        used += cost
+        headers.update({piece.section, (piece.section, piece.goal_id)})
+        kept.append(piece)
+
+    lines = []
+    current = None
+    for piece in sorted(kept, key=lambda p: (p.section, p.goal_order, p.order)):
+        goals, heading = sections[piece.section]
+        if current is None or current[0] != piece.section:
+            lines.append(heading if not lines else f"\n{heading}")
+        if current != (piece.section, piece.goal_id):
+            lines.append(f"- {goals.get(piece.goal_id, {}).get('title', 'Untitled Goal')}:")
+            current = (piece.section, piece.goal_id)
+        lines.append(piece.text)
+
+    text = "\n".join(lines) if lines else "No goal progress available yet."
+    return PromptContext(text, estimate_tokens(text), budget, dropped=len(pieces) - len(kept))
+
+
+async def get_prompt_context_async(user_email: str, goal_id: Optional[str] = None, query: str = "",
+                                   budget: int = CONTEXT_TOKEN_BUDGET) -> PromptContext:
+    """
+    Async get_prompt_context: the user document and the exchange search are
+    read concurrently.
+    """
+    reads = [db_async.get_user_data(user_email)]
+    if query:
+        reads.append(asyncio.to_thread(search_exchanges, user_email, query, RETRIEVAL_TOP_K))
+    user_data, *snippets = await db_async.gather(*reads)
+    return build_context(user_data, goal_id, query, budget, snippets[0] if snippets else [])
+
+
+def get_prompt_context(user_email: str, goal_id: Optional[str] = None, query: str = "",
+                       budget: int = CONTEXT_TOKEN_BUDGET) -> PromptContext:
+    """
+    Build budgeted prompt context for a chat about `goal_id`, including the
+    stored exchanges most similar to `query`.
+    """
+    return run_async(get_prompt_context_async(user_email, goal_id, query, budget))
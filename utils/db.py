@@ -1,208 +1,766 @@
-import firebase_admin
-from firebase_admin import credentials, firestore
-from datetime import datetime, timezone
-from utils.models import CheckinSummary, Goal, User
-from typing import Dict, List
+import copy
+import hashlib
+import threading
+from collections import OrderedDict
+
+from firebase_admin import firestore
+from cachetools import TTLCache
+from datetime import datetime, timedelta, timezone
+from utils.models import CheckinSummary, ClientSummary, Goal, User
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+from google.api_core.exceptions import NotFound
+from google.cloud.firestore_v1 import DocumentSnapshot
 from google.cloud.firestore_v1.base_query import FieldFilter
-import streamlit as st
+from google.cloud.firestore_v1.field_path import FieldPath
+from google.cloud.firestore_v1.transforms import (
+    ArrayRemove, ArrayUnion, Increment, Maximum, Minimum, Sentinel,
+)
+from utils.storage import create_client, transactional
 
-# Private global variable for Firestore client
+# Private global variable for the storage client (Firestore or in-memory, see utils/storage.py)
 _db = None
+_warm_up_started = False
 
-def _init_firebase():
+# Per-process read-through cache of user documents, keyed by email.
+# Entries expire after USER_CACHE_TTL seconds and the least recently used
+# entry is dropped once USER_CACHE_SIZE documents are held.
+USER_CACHE_TTL = 30
+USER_CACHE_SIZE = 512
+
+_user_cache = TTLCache(maxsize=USER_CACHE_SIZE, ttl=USER_CACHE_TTL)
+_user_cache_lock = threading.Lock()
+
+# Documents requested per batched get_all round trip
+GET_ALL_BATCH_SIZE = 100
+
+# Default number of check-ins returned per page
+CHECKIN_PAGE_SIZE = 20
+
+# Coach client listings: only these fields are fetched, one page at a time.
+# Summary rows and page membership are cached briefly per process.
+CLIENT_PAGE_SIZE = 25
+CLIENT_SUMMARY_FIELDS = ["email", "name", "active", "created_at"]
+CLIENT_LIST_CACHE_TTL = 60
+
+_client_summary_cache = TTLCache(maxsize=4096, ttl=CLIENT_LIST_CACHE_TTL)
+_client_page_cache = TTLCache(maxsize=256, ttl=CLIENT_LIST_CACHE_TTL)
+_client_list_lock = threading.Lock()
+
+# Live copies of watched user documents, kept current by on_snapshot
+# listeners (see watch_user). These take precedence over the TTL cache.
+LIVE_MAX_WATCHES = 256
+
+_live_watches = OrderedDict()  # email -> listener handle
+_live_docs: Dict[str, dict] = {}
+_live_versions: Dict[str, int] = {}
+_live_subscribers: Dict[str, List[Callable[[str], None]]] = {}
+
+# Update values that Firestore resolves server-side
+_TRANSFORMS = (Sentinel, ArrayUnion, ArrayRemove, Increment, Maximum, Minimum)
+
+_db_lock = threading.Lock()
+
+def get_db():
+    """
+    Return the storage client, creating it on first use.
+
+    Nothing connects at import time, so pages that need no data (like the
+    login screen) don't pay for credential parsing or channel setup.
+    """
     global _db
-    if not firebase_admin._apps:
-        # try:
-        #     cred = credentials.Certificate("secrets/firebase_secret.json")
-        # except:
-        cred = credentials.Certificate(dict(st.secrets["firebase"]['fb_secret']))
-        firebase_admin.initialize_app(cred)
-    
     if _db is None:
-        _db = firestore.client()
-    
+        with _db_lock:
+            if _db is None:
+                _db = create_client()
+
     return _db
 
-_init_firebase()
+def warm_up() -> None:
+    """
+    Start connecting to the storage backend on a background thread.
+
+    Safe to call on every rerun: only the first call in a process does anything.
+    """
+    global _warm_up_started
+    with _db_lock:
+        if _warm_up_started:
+            return
+        _warm_up_started = True
+
+    def _connect():
+        try:
+            # A lookup of a missing document is enough to open the channel
+            get_db().collection("users").document("_warm_up").get()
+        except Exception:
+            pass  # the first real data access will surface the error
+
+    threading.Thread(target=_connect, name="db-warm-up", daemon=True).start()
+
+# -------------------- User Document Cache -------------------- #
+
+def get_user_ref(user_email: str):
+    return get_db().collection("users").document(user_email)
+
+def get_user_data(user_email: str) -> dict | None:
+    """
+    Return a copy of the user's document, reading Firestore only when it is
+    neither watched by a live listener nor in the cache.
+    """
+    cached = peek_user_data(user_email)
+    if cached is not None:
+        return cached
+
+    doc = get_user_ref(user_email).get()
+    if not doc.exists:
+        return None
+
+    data = doc.to_dict()
+    with _user_cache_lock:
+        _user_cache[user_email] = data
+    return copy.deepcopy(data)
+
+def _cache_user_data(user_email: str, data: dict) -> None:
+    with _user_cache_lock:
+        _user_cache[user_email] = copy.deepcopy(data)
+
+def peek_user_data(user_email: str) -> dict | None:
+    """
+    Return a copy of the live or cached user document without reading Firestore.
+    """
+    with _user_cache_lock:
+        cached = _live_docs.get(user_email) or _user_cache.get(user_email)
+    return copy.deepcopy(cached) if cached is not None else None
+
+def remember_user_data(user_email: str, data: dict) -> None:
+    """
+    Put a user document fetched elsewhere (e.g. by utils.db_async) into the cache.
+    """
+    _cache_user_data(user_email, data)
+
+def invalidate_user_cache(user_email: str | None = None) -> None:
+    """
+    Drop one cached user document, or the whole cache when no email is given.
+
+    Live copies of watched users are kept: their listener already replaces
+    them with the server's version after every change, including the write
+    that led to this call. That write may have been delivered already, so
+    dropping the copy could leave it empty until the next change.
+    """
+    with _user_cache_lock:
+        if user_email is None:
+            _user_cache.clear()
+        else:
+            _user_cache.pop(user_email, None)
+
+def _replay_update(data: dict, updates: dict) -> dict | None:
+    """
+    Return a copy of `data` with an `update()` applied locally.
+
+    Plain values, DELETE_FIELD, ArrayUnion and ArrayRemove are replayed at
+    their dotted field paths. Other server-side transforms (timestamps,
+    increments) can't be replayed reliably, so they return None instead.
+    """
+    data = copy.deepcopy(data)
+    for path, value in updates.items():
+        *parents, leaf = path.split(".")
+        target = data
+        for key in parents:
+            if not isinstance(target.get(key), dict):
+                target[key] = {}
+            target = target[key]
+
+        if value is firestore.DELETE_FIELD:
+            target.pop(leaf, None)
+        elif isinstance(value, ArrayUnion):
+            items = list(target.get(leaf) or [])
+            items.extend(v for v in copy.deepcopy(value.values) if v not in items)
+            target[leaf] = items
+        elif isinstance(value, ArrayRemove):
+            target[leaf] = [v for v in target.get(leaf) or [] if v not in value.values]
+        elif isinstance(value, _TRANSFORMS):
+            return None
+        else:
+            target[leaf] = copy.deepcopy(value)
+    return data
+
+def _apply_cached_update(user_email: str, updates: dict) -> None:
+    """
+    Mirror a successful `update()` into the cached and live copies of the
+    document, evicting any copy the update can't be replayed on.
+    """
+    notify = False
+    with _user_cache_lock:
+        for store in (_user_cache, _live_docs):
+            current = store.get(user_email)
+            if current is None:
+                continue
+
+            updated = _replay_update(current, updates)
+            if updated is None:
+                store.pop(user_email, None)
+            else:
+                store[user_email] = updated
+
+            if store is _live_docs:
+                _live_versions[user_email] = _live_versions.get(user_email, 0) + 1
+                notify = True
+
+    if notify:
+        _notify_user_watchers(user_email)
+
+def _update_user(user_email: str, updates: dict) -> bool:
+    """
+    Apply `updates` to the user's document with a single write and keep the
+    cache in step. Returns False if the document doesn't exist.
+    """
+    try:
+        get_user_ref(user_email).update(updates)
+    except NotFound:
+        invalidate_user_cache(user_email)
+        return False
+    except Exception:
+        invalidate_user_cache(user_email)
+        raise
+    _apply_cached_update(user_email, updates)
+    return True
+
+# -------------------- Live Sync -------------------- #
+
+def _on_user_snapshot(user_email: str, docs) -> None:
+    data = docs[0].to_dict() if docs and docs[0].exists else None
+    with _user_cache_lock:
+        if user_email not in _live_watches:
+            return
+        # A write from this process was already replayed into the live copy
+        # (and counted) by _apply_cached_update
+        if data is not None and data == _live_docs.get(user_email):
+            return
+        if data is None:
+            _live_docs.pop(user_email, None)
+        else:
+            _live_docs[user_email] = data
+        _live_versions[user_email] = _live_versions.get(user_email, 0) + 1
+    _notify_user_watchers(user_email)
+
+def _notify_user_watchers(user_email: str) -> None:
+    with _user_cache_lock:
+        callbacks = list(_live_subscribers.get(user_email, []))
+    for callback in callbacks:
+        callback(user_email)
+
+def watch_user(user_email: str) -> None:
+    """
+    Keep a live local copy of a user's document with a snapshot listener.
+
+    Listeners are shared by every session in the process; at most
+    LIVE_MAX_WATCHES are kept, the least recently requested being dropped.
+    """
+    with _user_cache_lock:
+        if user_email in _live_watches:
+            _live_watches.move_to_end(user_email)
+            return
+        _live_watches[user_email] = None
+
+        evicted = []
+        while len(_live_watches) > LIVE_MAX_WATCHES:
+            email, watch = _live_watches.popitem(last=False)
+            _live_docs.pop(email, None)
+            evicted.append(watch)
+
+    for watch in evicted:
+        if watch is not None:
+            watch.unsubscribe()
+
+    watch = get_user_ref(user_email).on_snapshot(
+        lambda docs, changes, read_time: _on_user_snapshot(user_email, docs)
+    )
+    with _user_cache_lock:
+        if user_email in _live_watches:
+            _live_watches[user_email] = watch
+            return
+    watch.unsubscribe()  # evicted while the listener was starting
+
+def unwatch_user(user_email: str) -> None:
+    with _user_cache_lock:
+        watch = _live_watches.pop(user_email, None)
+        _live_docs.pop(user_email, None)
+    if watch is not None:
+        watch.unsubscribe()
+
+def get_user_version(user_email: str) -> int:
+    """
+    Return a counter that increases whenever a watched user's document changes.
+    """
+    with _user_cache_lock:
+        return _live_versions.get(user_email, 0)
+
+def subscribe_user(user_email: str, callback: Callable[[str], None]) -> Callable[[], None]:
+    """
+    Call `callback(email)` whenever a watched user's document changes.
+    Returns a function that removes the subscription.
+    """
+    with _user_cache_lock:
+        _live_subscribers.setdefault(user_email, []).append(callback)
+
+    def _unsubscribe():
+        with _user_cache_lock:
+            callbacks = _live_subscribers.get(user_email, [])
+            if callback in callbacks:
+                callbacks.remove(callback)
+    return _unsubscribe
 
 # -------------------- Firestore Access Functions -------------------- #
 
+def _checkins_ref(user_email: str):
+    return get_user_ref(user_email).collection("checkins")
+
+def _checkin_id(checkin: dict) -> str:
+    hash_input = f'{checkin.get("goal_id")}|{checkin.get("timestamp")}|{checkin.get("raw_text")}'
+    return hashlib.sha256(hash_input.encode()).hexdigest()[:16]
+
+
 def get_user(user_info: dict) -> User:
-    doc_ref = _db.collection("users").document(user_info["email"])
-    doc = doc_ref.get()
+    user_data = get_user_data(user_info["email"])
+
+    if user_data is not None:
+        return User(**user_data)
 
-    if doc.exists:
-        return User(**doc.to_dict())
+def get_users(user_emails: Iterable[str]) -> Dict[str, User]:
+    """
+    Fetch several users at once, keyed by email. Missing users are skipped.
+
+    Users already in the cache are served from it. The rest come back in
+    batched `get_all` calls, about one round trip per GET_ALL_BATCH_SIZE
+    users, and are added to the cache.
+    """
+    user_emails = list(dict.fromkeys(user_emails))
+    found = {}
+    missing = []
+    for email in user_emails:
+        cached = peek_user_data(email)
+        if cached is not None:
+            found[email] = cached
+        else:
+            missing.append(email)
+
+    for start in range(0, len(missing), GET_ALL_BATCH_SIZE):
+        refs = [get_user_ref(email) for email in missing[start:start + GET_ALL_BATCH_SIZE]]
+        for doc in get_db().get_all(refs):
+            if doc.exists:
+                data = doc.to_dict()
+                _cache_user_data(doc.id, data)
+                found[doc.id] = data
+
+    return {email: User(**found[email]) for email in user_emails if email in found}
+
+def get_clients(coach_email: str, client_emails: Iterable[str]) -> Dict[str, User]:
+    """
+    Bulk version of get_client: only clients assigned to this coach are returned.
+    """
+    users = get_users(client_emails)
+    return {email: user for email, user in users.items() if user.coach_email == coach_email}
 
 def create_user(user_info: dict) -> User:
-    doc_ref = _db.collection("users").document(user_info["email"])
-    doc = doc_ref.get()
-    if not doc.exists:
-        doc_ref.set({
+    user_data = get_user_data(user_info["email"])
+    if user_data is None:
+        user_data = {
             "email": user_info["email"],
             "name": user_info["name"],
             "role": user_info["role"],  # default to client
             "created_at": datetime.now(timezone.utc).isoformat(),
             "active": True,
             "currentPlan": None,
-            "previousPlans": []
-        })
-        doc = doc_ref.get()
-    return User(**doc.to_dict())
+            "currentPlanVersion": 0
+        }
+        get_user_ref(user_info["email"]).set(user_data)
+        _cache_user_data(user_info["email"], user_data)
+        invalidate_client_listing()
+    return User(**user_data)
+
+def _plans_ref(user_email: str):
+    return get_user_ref(user_email).collection("plans")
+
+def _plan_doc_id(version: int) -> str:
+    return f"{version:06d}"
 
 def get_latest_plan(user_email):
-    plans = _db.collection("users").document(user_email).collection("plans")\
-        .order_by("timestamp", direction=firestore.Query.DESCENDING).limit(1).stream()
+    plans = _plans_ref(user_email)\
+        .order_by("version", direction=firestore.Query.DESCENDING).limit(1).stream()
     for p in plans:
         return p.to_dict()
     return None
 
-def get_all_clients():
-    users_ref = _db.collection("users")
-    query = users_ref.where(filter=FieldFilter("role", "==", "client")).stream()
+def get_plan_history(user_email: str, limit: int = 10, before_version: Optional[int] = None) -> List[Dict]:
+    """
+    Return up to `limit` versioned plans, newest first.
+
+    Pass the lowest version already shown as `before_version` to load the
+    next older page. History lives in the plans subcollection and is only
+    read when someone asks for it.
+    """
+    query = _plans_ref(user_email).order_by("version", direction=firestore.Query.DESCENDING)
+    if before_version is not None:
+        query = query.where(filter=FieldFilter("version", "<", before_version))
+    return [doc.to_dict() for doc in query.limit(limit).stream()]
+
+def _coach_clients_query(coach_email: str):
+    """
+    Clients assigned to a coach. Served by the (role, coach_email, __name__)
+    composite index declared in firestore.indexes.json.
+    """
+    return get_db().collection("users")\
+        .where(filter=FieldFilter("role", "==", "client"))\
+        .where(filter=FieldFilter("coach_email", "==", coach_email))
+
+def list_clients(coach_email: str, page_size: int = CLIENT_PAGE_SIZE,
+                 cursor: Optional[str] = None) -> Tuple[List[ClientSummary], Optional[str]]:
+    """
+    Return one page of the coach's client summary rows ordered by email, plus
+    the cursor (last email on the page) for the next page, or None after the
+    last page.
+
+    Only CLIENT_SUMMARY_FIELDS are read, so the cost depends on the page size
+    rather than on how much plan and check-in data each client has.
+    """
+    page_key = (coach_email, cursor, page_size)
+    with _client_list_lock:
+        page = _client_page_cache.get(page_key)
+        if page is not None:
+            emails, next_cursor = page
+            rows = [_client_summary_cache.get(email) for email in emails]
+            if all(rows):
+                return rows, next_cursor
+
+    query = _coach_clients_query(coach_email)\
+        .select(CLIENT_SUMMARY_FIELDS)\
+        .order_by(FieldPath.document_id())
+    if cursor is not None:
+        query = query.start_after({FieldPath.document_id(): get_user_ref(cursor)})
+
+    rows = []
+    for doc in query.limit(page_size).stream():
+        data = doc.to_dict()
+        rows.append(ClientSummary(
+            email=data.get("email", doc.id),
+            name=data.get("name", ""),
+            active=data.get("active", True),
+            created_at=data.get("created_at"),
+        ))
+
+    next_cursor = rows[-1].email if len(rows) == page_size else None
+    with _client_list_lock:
+        for row in rows:
+            _client_summary_cache[row.email] = row
+        _client_page_cache[page_key] = ([row.email for row in rows], next_cursor)
+    return rows, next_cursor
+
+def invalidate_client_listing() -> None:
+    """
+    Drop cached client pages and summary rows, e.g. after a role change.
+    """
+    with _client_list_lock:
+        _client_page_cache.clear()
+        _client_summary_cache.clear()
+
+def get_all_clients(coach_email: str):
+    query = _coach_clients_query(coach_email).stream()
     return [doc.to_dict() for doc in query]
 
-def new_user_goals(user_email: str, new_plan: dict):
-    user_ref = _db.collection("users").document(user_email)
-    user_doc = user_ref.get()
-    
-    if user_doc.exists:
-        user_data = user_doc.to_dict()
-        previous = user_data.get("currentPlan")
-        
-        updates = {
-            "currentPlan": new_plan,
-        }
+def get_client(coach_email: str, client_email: str) -> User | None:
+    """
+    Return a client's full User only if they are assigned to this coach.
+    """
+    user_data = get_user_data(client_email)
+    if user_data is not None and user_data.get("coach_email") == coach_email:
+        return User(**user_data)
 
-        if previous:
-            firestore.ArrayUnion
-            updates["previousPlans"] = firestore.ArrayUnion([previous])
+def assign_client(coach_email: str, client_email: str) -> bool:
+    """
+    Assign an existing, unassigned client to a coach.
 
-        user_ref.update(updates)
+    Runs in a transaction so two coaches can't claim the same client.
+    Returns False if the user doesn't exist, isn't a client, or already
+    belongs to another coach.
+    """
+    user_ref = get_user_ref(client_email)
 
-def update_user_goals(client_email: str, goals: Dict[str,Goal]) -> None:
-    user_ref = _db.collection("users").document(client_email)
-    user_doc = user_ref.get()
-
-    if user_doc.exists:
-        user_data = user_doc.to_dict()
-        current_plan = user_data.get("currentPlan")
-        
-        current_plan["goals"] = goals["goals"]
-
-        
-        user_ref.update({
-            "currentPlan": current_plan
-        })
+    @transactional
+    def _assign(transaction) -> bool:
+        snapshot = user_ref.get(transaction=transaction)
+        if not snapshot.exists:
+            return False
 
-def save_user_events(user_email: str, events: List[Dict]):
+        data = snapshot.to_dict()
+        if data.get("role") != "client" or data.get("coach_email") not in (None, coach_email):
+            return False
+
+        transaction.update(user_ref, {"coach_email": coach_email})
+        return True
+
+    assigned = _assign(get_db().transaction())
+    if assigned:
+        _apply_cached_update(client_email, {"coach_email": coach_email})
+        invalidate_client_listing()
+    return assigned
+
+def unassign_client(coach_email: str, client_email: str) -> None:
     """
-    Save user's events to Firestore under the user document.
+    Remove a client from a coach's caseload.
+    """
+    if get_client(coach_email, client_email) is not None:
+        _update_user(client_email, {"coach_email": firestore.DELETE_FIELD})
+        invalidate_client_listing()
+
+def _archive_legacy_plans(transaction, user_email: str, data: dict) -> int:
     """
-    user_ref = _db.collection("users").document(user_email)
-    user_doc = user_ref.get()
+    Move a pre-versioning `previousPlans` array and `currentPlan` into the
+    plans subcollection as versions 1..n. Returns the current plan's version.
+    """
+    plans = list(data.get("previousPlans") or [])
+    if data.get("currentPlan"):
+        plans.append(data["currentPlan"])
+
+    for version, plan in enumerate(plans, start=1):
+        transaction.set(
+            _plans_ref(user_email).document(_plan_doc_id(version)),
+            {**plan, "version": version, "timestamp": None}
+        )
+
+    transaction.update(get_user_ref(user_email), {
+        "currentPlanVersion": len(plans),
+        "previousPlans": firestore.DELETE_FIELD,
+    })
+    return len(plans)
 
-    if user_doc.exists:
-        user_data = user_doc.to_dict()
-        current_plan = user_data.get("currentPlan")
+def new_user_goals(user_email: str, new_plan: dict):
+    """
+    Publish `new_plan` as the user's current plan under the next version number.
 
-        current_plan["events"] = events
+    The outgoing plan's final state (including goal edits and scheduled
+    events) is written back to its version document, so the user document
+    only ever holds the current plan and its version pointer.
+    """
+    user_ref = get_user_ref(user_email)
+
+    @transactional
+    def _publish(transaction) -> None:
+        snapshot = user_ref.get(transaction=transaction)
+        if not snapshot.exists:
+            return
+
+        data = snapshot.to_dict()
+        version = data.get("currentPlanVersion")
+        if version is None:
+            version = _archive_legacy_plans(transaction, user_email, data)
+        elif data.get("currentPlan"):
+            # Replace the plan fields outright: a deep merge would bring back
+            # goals deleted since this version was published
+            transaction.set(
+                _plans_ref(user_email).document(_plan_doc_id(version)),
+                data["currentPlan"], merge=list(data["currentPlan"])
+            )
+
+        new_version = version + 1
+        transaction.set(_plans_ref(user_email).document(_plan_doc_id(new_version)), {
+            **new_plan,
+            "version": new_version,
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+        })
+        transaction.update(user_ref, {
+            "currentPlan": new_plan,
+            "currentPlanVersion": new_version,
+        })
+
+    try:
+        _publish(get_db().transaction())
+    finally:
+        invalidate_user_cache(user_email)
 
+def publish_plans(plans: Dict[str, dict]) -> Dict[str, bool]:
+    """
+    Bulk version of new_user_goals: publish new current plans for several
+    users with batched reads and writes instead of one transaction each.
 
-        user_ref.update({
-            "currentPlan": current_plan
+    Users still on legacy plan storage go through new_user_goals. Returns,
+    per email, whether the plan was saved.
+    """
+    emails = list(plans)
+    snapshots = {}
+    for start in range(0, len(emails), GET_ALL_BATCH_SIZE):
+        refs = [get_user_ref(email) for email in emails[start:start + GET_ALL_BATCH_SIZE]]
+        for doc in get_db().get_all(refs):
+            snapshots[doc.id] = doc
+
+    saved = {email: False for email in emails}
+    timestamp = datetime.now(timezone.utc).isoformat()
+    batch, batch_emails = get_db().batch(), []
+
+    def _commit():
+        try:
+            batch.commit()
+            saved.update({email: True for email in batch_emails})
+        except Exception:
+            pass  # these users keep saved=False
+
+    for email in emails:
+        snapshot = snapshots.get(email)
+        if snapshot is None or not snapshot.exists:
+            continue
+
+        data = snapshot.to_dict()
+        version = data.get("currentPlanVersion")
+        if version is None:
+            try:
+                new_user_goals(email, plans[email])
+                saved[email] = True
+            except Exception:
+                pass
+            continue
+
+        # Three writes per user; Firestore caps a batch at 500
+        if len(batch_emails) * 3 >= 450:
+            _commit()
+            batch, batch_emails = get_db().batch(), []
+
+        if data.get("currentPlan"):
+            batch.set(_plans_ref(email).document(_plan_doc_id(version)), data["currentPlan"],
+                      merge=list(data["currentPlan"]))
+        batch.set(_plans_ref(email).document(_plan_doc_id(version + 1)), {
+            **plans[email],
+            "version": version + 1,
+            "timestamp": timestamp,
+        })
+        batch.update(get_user_ref(email), {
+            "currentPlan": plans[email],
+            "currentPlanVersion": version + 1,
         })
+        batch_emails.append(email)
+
+    if batch_emails:
+        _commit()
 
+    for email in emails:
+        invalidate_user_cache(email)
+    return saved
 
-def add_main_goal(user_email: str, new_goal: Goal) -> None:
+def migrate_plan_history(user_email: str) -> None:
     """
-    Add a new Goal object to the user's main_goals dict in Firestore.
+    Move a user's legacy `previousPlans` array into the plans subcollection.
     """
-    user_ref = _db.collection("users").document(user_email)
-    user_doc = user_ref.get()
+    user_ref = get_user_ref(user_email)
 
-    if user_doc.exists:
-        user_data = user_doc.to_dict()
-        main_goals = user_data.get("main_goals", {})
+    @transactional
+    def _migrate(transaction) -> None:
+        snapshot = user_ref.get(transaction=transaction)
+        if snapshot.exists and snapshot.to_dict().get("currentPlanVersion") is None:
+            _archive_legacy_plans(transaction, user_email, snapshot.to_dict())
 
-        # Avoid overwrite if key exists
-        if new_goal.id not in main_goals:
-            main_goals[new_goal.id] = new_goal.model_dump()
-            user_ref.update({"main_goals": main_goals})
+    try:
+        _migrate(get_db().transaction())
+    finally:
+        invalidate_user_cache(user_email)
 
-def edit_main_goal(user_email: str, updated_goal: Goal) -> None:
+def migrate_all_plan_histories() -> int:
     """
-    Update an existing main goal by matching goal id in Firestore dict.
+    Run the plan history migration for every user without a plan version.
     """
-    user_ref = _db.collection("users").document(user_email)
-    user_doc = user_ref.get()
+    migrated = 0
+    for doc in get_db().collection("users").select(["currentPlanVersion"]).stream():
+        if (doc.to_dict() or {}).get("currentPlanVersion") is None:
+            migrate_plan_history(doc.id)
+            migrated += 1
+    return migrated
+
+def update_user_goals(client_email: str, goals: Dict[str,Goal]) -> None:
+    _update_user(client_email, {
+        "currentPlan.goals": goals["goals"]
+    })
 
-    if user_doc.exists:
-        user_data = user_doc.to_dict()
-        main_goals = user_data.get("main_goals", {})
+def save_user_events(user_email: str, events: List[Dict]):
+    """
+    Save user's events to Firestore under the user document.
+    """
+    _update_user(user_email, {
+        "currentPlan.events": events
+    })
 
-        if updated_goal.id in main_goals:
-            main_goals[updated_goal.id] = updated_goal.model_dump()
-            user_ref.update({"main_goals": main_goals})
 
-def delete_main_goal(user_email: str, goal_id: str) -> None:
+def _write_main_goal(user_email: str, goal: Goal, must_exist: bool) -> bool:
     """
-    Remove a main goal by goal id from user's main_goals dict in Firestore.
+    Write `goal` at its main_goals key in a transaction, only if that key is
+    already stored (`must_exist`) or not. Returns whether it was written.
     """
-    user_ref = _db.collection("users").document(user_email)
-    user_doc = user_ref.get()
+    field_path = f"main_goals.{goal.id}"
+    user_ref = get_user_ref(user_email)
+
+    @transactional
+    def _write(transaction) -> bool:
+        snapshot = user_ref.get(field_paths=[field_path], transaction=transaction)
+        if not snapshot.exists:
+            return False
+        if (goal.id in (snapshot.to_dict().get("main_goals") or {})) != must_exist:
+            return False
+        transaction.update(user_ref, {field_path: goal.model_dump()})
+        return True
+
+    try:
+        written = _write(get_db().transaction())
+    except Exception:
+        invalidate_user_cache(user_email)
+        raise
+    if written:
+        _apply_cached_update(user_email, {field_path: goal.model_dump()})
+    else:
+        invalidate_user_cache(user_email)
+    return written
 
-    if user_doc.exists:
-        user_data = user_doc.to_dict()
-        main_goals = user_data.get("main_goals", {})
+def add_main_goal(user_email: str, new_goal: Goal) -> bool:
+    """
+    Add a new Goal object to the user's main_goals dict in Firestore.
 
-        if goal_id in main_goals:
-            del main_goals[goal_id]
-            user_ref.update({"main_goals": main_goals})
+    An edited goal keeps its original id, so a goal already stored under
+    this id is left alone rather than overwritten. Returns whether it was added.
+    """
+    return _write_main_goal(user_email, new_goal, must_exist=False)
 
-def save_checkin(user_email: str, checkin_data: CheckinSummary) -> None:
+def edit_main_goal(user_email: str, updated_goal: Goal) -> bool:
     """
-    Append a new check-in to the user's checkins list.
+    Update an existing main goal by matching goal id in Firestore dict.
+
+    Does nothing if the goal was deleted meanwhile. Returns whether it was updated.
     """
-    user_ref = _db.collection("users").document(user_email)
-    user_doc = user_ref.get()
+    return _write_main_goal(user_email, updated_goal, must_exist=True)
 
-    if user_doc.exists:
-        user_data = user_doc.to_dict()
-        checkins = user_data.get("checkins", [])
+def delete_main_goal(user_email: str, goal_id: str) -> None:
+    """
+    Remove a main goal by goal id from user's main_goals dict in Firestore.
+    """
+    _update_user(user_email, {f"main_goals.{goal_id}": firestore.DELETE_FIELD})
 
-        checkins.append(checkin_data.model_dump())  # serialize to dict
-        user_ref.update({"checkins": checkins})
+def save_checkin(user_email: str, checkin_data: CheckinSummary) -> None:
+    """
+    Store a new check-in in the user's checkins subcollection.
+    """
+    data = checkin_data.model_dump()  # serialize to dict
+    _checkins_ref(user_email).document(_checkin_id(data)).set(data)
 
 
 def update_goal_context(user_email: str, goal_id: str, goal_type: str, new_summary: str) -> None:
     """
     Update LLM summary context for a main or coach goal.
     """
-    user_ref = _db.collection("users").document(user_email)
-    user_doc = user_ref.get()
-
-    if user_doc.exists:
-        field_name = "main_goal_context" if goal_type == "main" else "coach_goal_context"
-        user_data = user_doc.to_dict()
-        context = user_data.get(field_name, {})
-
-        context[goal_id] = new_summary
-        user_ref.update({field_name: context})
+    field_name = "main_goal_context" if goal_type == "main" else "coach_goal_context"
+    _update_user(user_email, {f"{field_name}.{goal_id}": new_summary})
 
-def get_llm_context(user_email: str) -> str:
+def format_llm_context(user_data: dict | None) -> str:
     """
-    Create prompt-ready context for the LLM based on user's goal summaries.
+    Render a user document's goal summaries as prompt-ready text.
     """
-    user_ref = _db.collection("users").document(user_email)
-    user_doc = user_ref.get()
     lines = []
 
-    if user_doc.exists:
-        user_data = user_doc.to_dict()
-        
-        main_goals = user_data.get("main_goals", {})
-        main_context = user_data.get("main_goal_context", {})
+    if user_data is not None:
+        main_goals = user_data.get("main_goals") or {}
+        main_context = user_data.get("main_goal_context") or {}
 
         if main_goals and main_context:
             lines.append("MAIN GOALS AND PROGRESS:")
@@ -211,8 +769,8 @@ def get_llm_context(user_email: str) -> str:
                 summary = main_context.get(gid, "No summary available.")
                 lines.append(f"- {title}: {summary}")
 
-        coach_goals = user_data.get("currentPlan", {}).get("goals", {})
-        coach_context = user_data.get("coach_goal_context", {})
+        coach_goals = (user_data.get("currentPlan") or {}).get("goals") or {}
+        coach_context = user_data.get("coach_goal_context") or {}
 
         if coach_goals and coach_context:
             lines.append("\nCOACH GOALS AND PROGRESS:")
@@ -223,43 +781,219 @@ def get_llm_context(user_email: str) -> str:
 
     return "\n".join(lines) if lines else "No goal progress available yet."
 
+def get_llm_context(user_email: str) -> str:
+    """
+    Create prompt-ready context for the LLM based on user's goal summaries.
+    """
+    return format_llm_context(get_user_data(user_email))
+
 
 def get_recent_checkins(user_email: str, limit: int = 5) -> List[Dict]:
-    user_ref = _db.collection("users").document(user_email)
-    user_doc = user_ref.get()
+    query = _checkins_ref(user_email)\
+        .order_by("timestamp", direction=firestore.Query.DESCENDING).limit(limit).stream()
+    return [doc.to_dict() for doc in query]
 
-    if user_doc.exists:
-        checkins = user_doc.to_dict().get("checkins", [])
-        return sorted(checkins, key=lambda x: x.get("timestamp", ""), reverse=True)[:limit]
-    return []
 
+def get_checkins_page(user_email: str, page_size: int = CHECKIN_PAGE_SIZE,
+                      cursor: Optional[DocumentSnapshot] = None) -> Tuple[List[Dict], Optional[DocumentSnapshot]]:
+    """
+    Return one page of check-ins, newest first, plus the cursor for the next page.
 
-def add_checkin_context_entry(user_email: str, goal_id: str, goal_type: str, user_msg: str, coach_msg: str) -> None:
+    Pass the returned cursor back in to continue; it is None once the last
+    page has been read.
     """
-    Appends a check-in summary string (user + coach exchange) to the correct context store in Firestore.
+    query = _checkins_ref(user_email).order_by("timestamp", direction=firestore.Query.DESCENDING)
+    if cursor is not None:
+        query = query.start_after(cursor)
+
+    docs = list(query.limit(page_size).stream())
+    next_cursor = docs[-1] if len(docs) == page_size else None
+    return [doc.to_dict() for doc in docs], next_cursor
+
+
+def migrate_checkins_to_subcollection(user_email: str) -> int:
+    """
+    Move a user's legacy `checkins` array into the checkins subcollection.
+
+    Documents are keyed by content, so re-running the migration is safe.
+    Returns the number of check-ins moved.
+    """
+    user_data = get_user_data(user_email)
+    if user_data is None or "checkins" not in user_data:
+        return 0
+
+    checkins = user_data.get("checkins") or []
+    checkins_ref = _checkins_ref(user_email)
+
+    # Firestore caps a batch at 500 writes
+    for start in range(0, len(checkins), 450):
+        batch = get_db().batch()
+        for checkin in checkins[start:start + 450]:
+            batch.set(checkins_ref.document(_checkin_id(checkin)), checkin)
+        batch.commit()
+
+    _update_user(user_email, {"checkins": firestore.DELETE_FIELD})
+    return len(checkins)
+
+
+def migrate_all_checkins() -> int:
+    """
+    Run the check-in migration for every user that still has a `checkins` array.
     """
-    user_ref = _db.collection("users").document(user_email)
-    user_doc = user_ref.get()
-    if not user_doc.exists:
-        return
+    moved = 0
+    for doc in get_db().collection("users").select(["checkins"]).stream():
+        if "checkins" in (doc.to_dict() or {}):
+            moved += migrate_checkins_to_subcollection(doc.id)
+    return moved
 
-    data = user_doc.to_dict()
 
+def _prefetched_ref(user_email: str):
+    return get_user_ref(user_email).collection("prefetched_checkins")
+
+def _prefetched_id(day: str, goal_id: str) -> str:
+    return f"{day}_{goal_id}"
+
+def save_prefetched_questions(user_email: str, day: str, entries: Dict[str, dict], ttl: int) -> None:
+    """
+    Store opening check-in questions per goal for `day`, expiring after `ttl` seconds.
+    """
+    now = datetime.now(timezone.utc)
+    expires_at = now + timedelta(seconds=ttl)
+    batch = get_db().batch()
+    for goal_id, entry in entries.items():
+        batch.set(_prefetched_ref(user_email).document(_prefetched_id(day, goal_id)), {
+            **entry,
+            "goal_id": goal_id,
+            "day": day,
+            "created_at": now,
+            "expires_at": expires_at,  # also usable as a Firestore TTL field
+        })
+    batch.commit()
+
+def get_prefetched_questions(user_email: str, day: str, goal_ids: Iterable[str]) -> Dict[str, dict]:
+    """
+    Unexpired prefetched questions for `day`, keyed by goal id, in one batched read.
+    """
+    return get_all_prefetched_questions(day, {user_email: goal_ids}).get(user_email, {})
+
+def get_all_prefetched_questions(day: str, goal_ids: Dict[str, Iterable[str]]) -> Dict[str, Dict[str, dict]]:
+    """
+    get_prefetched_questions for several users, keyed by email then goal id.
+    Reads every user's documents together, GET_ALL_BATCH_SIZE per round trip.
+    """
+    refs, owners = [], {}
+    for email, gids in goal_ids.items():
+        for gid in gids:
+            refs.append(_prefetched_ref(email).document(_prefetched_id(day, gid)))
+            owners[refs[-1].path] = email
+    now = datetime.now(timezone.utc)
+    found = {}
+    for start in range(0, len(refs), GET_ALL_BATCH_SIZE):
+        # get_all may return documents in any order
+        for doc in get_db().get_all(refs[start:start + GET_ALL_BATCH_SIZE]):
+            data = doc.to_dict() if doc.exists else None
+            if data and data["expires_at"] > now:
+                found.setdefault(owners[doc.reference.path], {})[data["goal_id"]] = data
+    return found
+
+
+def get_client_plans() -> Iterator[Tuple[str, dict]]:
+    """
+    (email, current plan) for every client with a plan, from a projected query.
+    """
+    query = get_db().collection("users").where(filter=FieldFilter("role", "==", "client"))
+    for doc in query.select(["currentPlan"]).stream():
+        plan = (doc.to_dict() or {}).get("currentPlan")
+        if plan:
+            yield doc.id, plan
+
+
+def format_exchange(user_msg: str, coach_msg: str) -> str:
+    return f"User: {user_msg}\nCoach: {coach_msg}"
+
+def add_checkin_context_entry(user_email: str, goal_id: str, goal_type: str, user_msg: str,
+                              coach_msg: str) -> str | None:
+    """
+    Appends a check-in summary string (user + coach exchange) to the correct context store in Firestore.
+
+    The append runs in a transaction on the stored context, like
+    replace_goal_context_prefix, so it can't undo a concurrent compaction or
+    lose an exchange appended from another tab. Returns the updated context,
+    or None if the user doesn't exist. Use utils.exchanges.save_exchange to
+    also index the exchange and compact the context.
+    """
     # Choose correct context key
     context_key = "coach_goal_context" if goal_type == "coach" else "main_goal_context"
-
-    existing_context = data.get(context_key, {}).get(goal_id, "")
+    field_path = f"{context_key}.{goal_id}"
+    user_ref = get_user_ref(user_email)
 
     # Format the new exchange as text
-    new_entry = f"User: {user_msg}\nCoach: {coach_msg}"
+    new_entry = format_exchange(user_msg, coach_msg)
+
+    @transactional
+    def _append(transaction) -> str | None:
+        snapshot = user_ref.get(field_paths=[field_path], transaction=transaction)
+        if not snapshot.exists:
+            return None
+
+        # Combine with existing string context
+        existing_context = (snapshot.to_dict().get(context_key) or {}).get(goal_id, "")
+        updated = f"{existing_context}\n\n{new_entry}" if existing_context else new_entry
+        transaction.update(user_ref, {field_path: updated})
+        return updated
+
+    try:
+        updated_context = _append(get_db().transaction())
+    except Exception:
+        invalidate_user_cache(user_email)
+        raise
+    if updated_context is None:
+        invalidate_user_cache(user_email)
+        return None
+    _apply_cached_update(user_email, {field_path: updated_context})
+    return updated_context
+
+def get_goal_context(user_email: str, goal_id: str, goal_type: str) -> str:
+    """
+    Return the stored context string for a single main or coach goal.
+    """
+    data = get_user_data(user_email) or {}
+    context_key = "coach_goal_context" if goal_type == "coach" else "main_goal_context"
+    return (data.get(context_key) or {}).get(goal_id, "")
 
-    # Combine with existing string context
-    updated_context = f"{existing_context}\n\n{new_entry}" if existing_context else new_entry
+def replace_goal_context_prefix(user_email: str, goal_id: str, goal_type: str, old_prefix: str, new_prefix: str) -> bool:
+    """
+    Atomically swap the leading `old_prefix` of a goal's context for `new_prefix`.
 
-    # Prepare update
-    user_ref.update({
-        f"{context_key}.{goal_id}": updated_context
-    })
+    Runs in a transaction so exchanges appended while the replacement was
+    being prepared are kept. Returns False, without writing, if the stored
+    context no longer starts with `old_prefix`.
+    """
+    context_key = "coach_goal_context" if goal_type == "coach" else "main_goal_context"
+    field_path = f"{context_key}.{goal_id}"
+    user_ref = get_user_ref(user_email)
+
+    @transactional
+    def _swap(transaction) -> str | None:
+        snapshot = user_ref.get(transaction=transaction)
+        if not snapshot.exists:
+            return None
+
+        current = (snapshot.to_dict().get(context_key) or {}).get(goal_id, "")
+        if not current.startswith(old_prefix):
+            return None
+
+        updated = new_prefix + current[len(old_prefix):]
+        transaction.update(user_ref, {field_path: updated})
+        return updated
+
+    updated = _swap(get_db().transaction())
+    if updated is None:
+        invalidate_user_cache(user_email)
+        return False
+
+    _apply_cached_update(user_email, {field_path: updated})
+    return True
 
 def update_user_role(user_email: str, new_role: str) -> User:
     """
@@ -272,15 +1006,16 @@ def update_user_role(user_email: str, new_role: str) -> User:
     Returns:
         User: The updated User model instance.
     """
-    user_ref = _db.collection("users").document(user_email)
-    user_doc = user_ref.get()
+    user_data = get_user_data(user_email)
 
-    if user_doc.exists:
-        user_ref.update({
+    if user_data is not None:
+        updates = {
             "role": new_role,
             "first_time_user": False
-        })
-        updated_doc = user_ref.get()
-        return User(**updated_doc.to_dict())
+        }
+        _update_user(user_email, updates)
+        invalidate_client_listing()
+        user_data.update(updates)
+        return User(**user_data)
     else:
         raise ValueError(f"User with email {user_email} not found.")
@@ -0,0 +1,118 @@
+"""
+asyncio versions of the read paths in utils/db.py.
+
+Built on Firestore's AsyncClient (or the in-memory stand-in), and sharing
+utils.db's user cache, so independent reads in one rerun can overlap:
+
+    client, checkins = run_async(gather(
+        get_client(coach_email, client_email),
+        get_recent_checkins(client_email),
+    ))
+"""
+import asyncio
+import threading
+import weakref
+from typing import Awaitable, Dict, Iterable, List
+
+from firebase_admin import firestore
+
+from utils.db import (
+    GET_ALL_BATCH_SIZE, get_db, format_llm_context, peek_user_data, remember_user_data,
+)
+from utils.models import User
+from utils.storage import create_async_client
+
+# AsyncClient channels are bound to the event loop they were created on
+_clients = weakref.WeakKeyDictionary()
+_clients_lock = threading.Lock()
+
+
+def _get_async_db():
+    loop = asyncio.get_running_loop()
+    with _clients_lock:
+        client = _clients.get(loop)
+        if client is None:
+            client = _clients[loop] = create_async_client(get_db())
+    return client
+
+
+def _user_ref(user_email: str):
+    return _get_async_db().collection("users").document(user_email)
+
+
+async def gather(*aws: Awaitable) -> List:
+    """
+    Await several reads concurrently and return their results in order.
+    """
+    return list(await asyncio.gather(*aws))
+
+
+async def get_user_data(user_email: str) -> dict | None:
+    cached = peek_user_data(user_email)
+    if cached is not None:
+        return cached
+
+    doc = await _user_ref(user_email).get()
+    if not doc.exists:
+        return None
+
+    data = doc.to_dict()
+    remember_user_data(user_email, data)
+    return data
+
+
+async def get_user(user_email: str) -> User | None:
+    user_data = await get_user_data(user_email)
+    if user_data is not None:
+        return User(**user_data)
+
+
+async def get_client(coach_email: str, client_email: str) -> User | None:
+    """
+    Return a client's full User only if they are assigned to this coach.
+    """
+    user_data = await get_user_data(client_email)
+    if user_data is not None and user_data.get("coach_email") == coach_email:
+        return User(**user_data)
+
+
+async def get_users(user_emails: Iterable[str]) -> Dict[str, User]:
+    """
+    Fetch several users with batched get_all calls, keyed by email.
+    Missing users are skipped; fetched ones are added to the cache.
+    """
+    user_emails = list(dict.fromkeys(user_emails))
+    found = {}
+    missing = []
+    for email in user_emails:
+        cached = peek_user_data(email)
+        if cached is not None:
+            found[email] = cached
+        else:
+            missing.append(email)
+
+    for start in range(0, len(missing), GET_ALL_BATCH_SIZE):
+        refs = [_user_ref(email) for email in missing[start:start + GET_ALL_BATCH_SIZE]]
+        async for doc in _get_async_db().get_all(refs):
+            if doc.exists:
+                data = doc.to_dict()
+                remember_user_data(doc.id, data)
+                found[doc.id] = data
+
+    return {email: User(**found[email]) for email in user_emails if email in found}
+
+
+async def get_llm_context(user_email: str) -> str:
+    return format_llm_context(await get_user_data(user_email))
+
+
+async def get_recent_checkins(user_email: str, limit: int = 5) -> List[Dict]:
+    query = _user_ref(user_email).collection("checkins")\
+        .order_by("timestamp", direction=firestore.Query.DESCENDING).limit(limit)
+    return [doc.to_dict() async for doc in query.stream()]
+
+
+async def get_plan_history(user_email: str, limit: int = 10) -> List[Dict]:
+    query = _user_ref(user_email).collection("plans")\
+        .order_by("version", direction=firestore.Query.DESCENDING).limit(limit)
+    return [doc.to_dict() async for doc in query.stream()]
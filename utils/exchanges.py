@@ -0,0 +1,22 @@
+"""
+Saving a finished check-in or main-goal chat exchange.
+
+The exchange is appended to the goal's stored context, embedded into the
+semantic index (utils/vector_index.py) so it stays retrievable after
+compaction, and the context is compacted in the background once it grows
+past CONTEXT_COMPACT_THRESHOLD. Kept apart from utils/db.py, which both of
+those modules build on.
+"""
+from utils.compaction import CONTEXT_COMPACT_THRESHOLD, schedule_compaction
+from utils.db import add_checkin_context_entry, format_exchange
+from utils.vector_index import index_exchanges
+
+
+def save_exchange(user_email: str, goal_id: str, goal_type: str, user_msg: str, coach_msg: str) -> None:
+    updated_context = add_checkin_context_entry(user_email, goal_id, goal_type, user_msg, coach_msg)
+    if updated_context is None:
+        return
+
+    index_exchanges(user_email, goal_id, goal_type, [format_exchange(user_msg, coach_msg)])
+    if len(updated_context) > CONTEXT_COMPACT_THRESHOLD:
+        schedule_compaction(user_email, goal_id, goal_type)
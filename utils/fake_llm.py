@@ -0,0 +1,165 @@
+"""
+A deterministic local stand-in for the Gemini model, selected with
+LLM_BACKEND=fake in utils/llm.py.
+
+It needs no network or API key and answers the same prompt the same way
+every time: text replies are a few canned coaching sentences, GoalsLiteOnly
+plans have the 1 high / 2 medium / 2 low goals plan_prompt asks for, and
+other structured outputs are filled in from the output type's JSON schema.
+Latency is artificial and configurable, so UI and DB throughput can be
+benchmarked offline:
+
+- LLM_FAKE_LATENCY: seconds before the response (or its first chunk).
+- LLM_FAKE_JITTER: up to this many extra seconds, seeded by the prompt.
+- LLM_FAKE_CHUNK_DELAY: seconds between streamed chunks.
+"""
+import asyncio
+import hashlib
+import json
+import os
+import random
+from typing import AsyncIterator, Dict, List, Optional, Union
+
+from pydantic_ai.messages import ModelMessage, ModelRequest, ModelResponse, TextPart, ToolCallPart, UserPromptPart
+from pydantic_ai.models.function import AgentInfo, DeltaToolCall, DeltaToolCalls, FunctionModel
+
+FAKE_MODEL_NAME = "fake"
+
+LLM_FAKE_LATENCY = float(os.getenv("LLM_FAKE_LATENCY", 0.5))
+LLM_FAKE_JITTER = float(os.getenv("LLM_FAKE_JITTER", 0))
+LLM_FAKE_CHUNK_DELAY = float(os.getenv("LLM_FAKE_CHUNK_DELAY", 0.02))
+
+# Items generated for array fields without a minItems/maxItems
+FAKE_LIST_LENGTH = 5
+
+_SENTENCES = [
+    "Thanks for sharing that.",
+    "You've put real effort in, and it shows.",
+    "What felt hardest about it today?",
+    "Try breaking tomorrow's task into one small first step.",
+    "How did it compare with what you expected?",
+    "Notice what helped you keep going, and lean on it again.",
+    "Which part would you like to focus on next?",
+    "Keep it simple: ten focused minutes is enough to build the habit.",
+]
+
+# The mix plan_prompt asks for; the UI only knows these plan importances
+_PLAN_IMPORTANCE = ["high", "medium", "medium", "low", "low"]
+
+_PLAN_GOALS = [
+    ("Sleep routine", "Be in bed by 11pm and note how rested you feel."),
+    ("Daily walk", "Take a 20-minute walk without your phone."),
+    ("Focus block", "Work on your top priority for one uninterrupted hour."),
+    ("Evening reflection", "Write down one thing that went well today."),
+    ("Hydration", "Drink a glass of water with every meal."),
+    ("Reach out", "Message a friend or colleague you haven't spoken to lately."),
+    ("Tidy space", "Spend ten minutes clearing your desk."),
+    ("Screen-free hour", "Keep the hour before bed free of screens."),
+]
+
+
+def _last_prompt(messages: List[ModelMessage]) -> str:
+    for message in reversed(messages):
+        if isinstance(message, ModelRequest):
+            for part in message.parts:
+                if isinstance(part, UserPromptPart):
+                    return part.content if isinstance(part.content, str) else repr(part.content)
+    return ""
+
+
+def _rng(messages: List[ModelMessage]) -> random.Random:
+    digest = hashlib.sha256(_last_prompt(messages).encode("utf-8")).digest()
+    return random.Random(int.from_bytes(digest[:8], "big"))
+
+
+def _sample(schema: Dict, defs: Dict, rng: random.Random, name: str, index: int):
+    """
+    A value valid against the subset of JSON schema pydantic generates.
+    """
+    if "$ref" in schema:
+        schema = defs[schema["$ref"].rsplit("/", 1)[-1]]
+    for key in ("anyOf", "oneOf"):
+        if key in schema:
+            options = [s for s in schema[key] if s.get("type") != "null"] or schema[key]
+            return _sample(options[0], defs, rng, name, index)
+    if "const" in schema:
+        return schema["const"]
+    if "enum" in schema:
+        return schema["enum"][index % len(schema["enum"])]
+
+    kind = schema.get("type")
+    if kind == "object":
+        properties = schema.get("properties", {})
+        return {key: _sample(sub, defs, rng, key, index) for key, sub in properties.items()}
+    if kind == "array":
+        length = max(schema.get("minItems", 0), min(schema.get("maxItems", FAKE_LIST_LENGTH), FAKE_LIST_LENGTH))
+        return [_sample(schema.get("items", {}), defs, rng, name, i) for i in range(length)]
+    if kind == "integer":
+        return schema.get("minimum", index)
+    if kind == "number":
+        return float(schema.get("minimum", index))
+    if kind == "boolean":
+        return index % 2 == 0
+    if kind == "null":
+        return None
+    return f"{name.replace('_', ' ').capitalize()} {index + 1}: {rng.choice(_SENTENCES)}"
+
+
+def _plan(rng: random.Random) -> Dict:
+    """
+    Plan-shaped GoalsLiteOnly output, which the generic sampler can't give.
+    """
+    goals = rng.sample(_PLAN_GOALS, len(_PLAN_IMPORTANCE))
+    return {"goals": [{"title": title, "task": task, "importance": importance}
+                      for (title, task), importance in zip(goals, _PLAN_IMPORTANCE)]}
+
+
+# Output types whose fake values must also make sense to the UI, by schema title
+_STRUCTURED = {
+    "GoalsLiteOnly": _plan,
+}
+
+
+def _structured_args(info: AgentInfo, rng: random.Random) -> str:
+    schema = info.output_tools[0].parameters_json_schema
+    if schema.get("title") in _STRUCTURED:
+        return json.dumps(_STRUCTURED[schema["title"]](rng))
+    return json.dumps(_sample(schema, schema.get("$defs", {}), rng, "value", 0))
+
+
+def _text(rng: random.Random) -> str:
+    return " ".join(rng.sample(_SENTENCES, 3))
+
+
+async def _delay(rng: random.Random) -> None:
+    await asyncio.sleep(LLM_FAKE_LATENCY + rng.uniform(0, LLM_FAKE_JITTER))
+
+
+async def _respond(messages: List[ModelMessage], info: AgentInfo) -> ModelResponse:
+    rng = _rng(messages)
+    await _delay(rng)
+    if info.output_tools and not info.allow_text_output:
+        tool = info.output_tools[0]
+        return ModelResponse(parts=[ToolCallPart(tool.name, _structured_args(info, rng))])
+    return ModelResponse(parts=[TextPart(_text(rng))])
+
+
+async def _stream(messages: List[ModelMessage], info: AgentInfo) -> AsyncIterator[Union[str, DeltaToolCalls]]:
+    rng = _rng(messages)
+    await _delay(rng)
+    if info.output_tools and not info.allow_text_output:
+        yield {0: DeltaToolCall(name=info.output_tools[0].name, json_args=_structured_args(info, rng))}
+        return
+
+    words = _text(rng).split(" ")
+    for i, word in enumerate(words):
+        if i:
+            await asyncio.sleep(LLM_FAKE_CHUNK_DELAY)
+        yield word if i == 0 else " " + word
+
+
+def create_fake_model(model_name: Optional[str] = None) -> FunctionModel:
+    """
+    A FunctionModel that answers both plain and streamed agent runs.
+    """
+    return FunctionModel(_respond, stream_function=_stream, model_name=model_name or FAKE_MODEL_NAME)
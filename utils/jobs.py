@@ -0,0 +1,139 @@
+"""
+Process-local queue for plan generation.
+
+Jobs run on a thread pool, outside any Streamlit script run, so a coach can
+queue plans for several clients and keep working or navigate away. Each job
+records its status and progress for the UI to poll, and saves the plan with
+new_user_goals when it finishes. Jobs live only as long as the process.
+"""
+import os
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Tuple
+
+from utils.db import new_user_goals
+from utils.plans import BulkPlanResult, generate_bulk_plans, generate_plan
+
+PLAN_JOB_WORKERS = int(os.getenv("PLAN_JOB_WORKERS", 4))
+
+# Finished jobs are kept this long (seconds) so the UI can show their outcome
+JOB_RETENTION = 3600
+
+QUEUED, RUNNING, DONE, FAILED = "queued", "running", "done", "failed"
+
+_executor = ThreadPoolExecutor(max_workers=PLAN_JOB_WORKERS, thread_name_prefix="plan-jobs")
+_jobs: Dict[str, "PlanJob"] = {}
+_jobs_lock = threading.Lock()
+
+
+@dataclass
+class PlanJob:
+    coach_email: str
+    client_email: Optional[str]  # None for bulk jobs
+    num_days: int
+    id: str = field(default_factory=lambda: uuid.uuid4().hex[:12])
+    status: str = QUEUED
+    progress: float = 0.0
+    stage: str = "Waiting for a worker"
+    error: Optional[str] = None
+    created_at: datetime = field(default_factory=lambda: datetime.now(timezone.utc))
+    finished_at: Optional[datetime] = None
+    results: List[BulkPlanResult] = field(default_factory=list)
+    client_count: int = 1
+
+    @property
+    def active(self) -> bool:
+        return self.status in (QUEUED, RUNNING)
+
+    @property
+    def label(self) -> str:
+        return self.client_email or f"{self.client_count} clients"
+
+
+def _set(job: PlanJob, **changes) -> None:
+    with _jobs_lock:
+        for name, value in changes.items():
+            setattr(job, name, value)
+
+
+def _run_plan_job(job: PlanJob, summary: str, use_cache: bool) -> None:
+    try:
+        _set(job, status=RUNNING, progress=0.1, stage="Generating goals")
+        plan = generate_plan(summary, job.num_days, use_cache=use_cache)
+
+        _set(job, progress=0.8, stage="Saving plan")
+        new_user_goals(job.client_email, plan.model_dump())
+
+        _set(job, status=DONE, progress=1.0, stage="Plan saved")
+    except Exception as e:
+        _set(job, status=FAILED, stage="Failed", error=str(e) or type(e).__name__)
+    finally:
+        _set(job, finished_at=datetime.now(timezone.utc))
+
+
+def _run_bulk_plan_job(job: PlanJob, items: List[Tuple[str, str]], use_cache: bool) -> None:
+    def _progress(done: int, total: int) -> None:
+        _set(job, progress=0.9 * done / max(total, 1), stage=f"Generated {done} of {total} plans")
+
+    try:
+        _set(job, status=RUNNING, progress=0.0, stage="Generating plans")
+        results = generate_bulk_plans(job.coach_email, items, job.num_days, use_cache=use_cache,
+                                      on_progress=_progress)
+        saved = sum(r.ok for r in results)
+        _set(job, status=DONE, progress=1.0, results=results,
+             stage=f"Saved {saved} of {len(results)} plans")
+    except Exception as e:
+        _set(job, status=FAILED, stage="Failed", error=str(e) or type(e).__name__)
+    finally:
+        _set(job, finished_at=datetime.now(timezone.utc))
+
+
+def _prune() -> None:
+    now = datetime.now(timezone.utc)
+    with _jobs_lock:
+        for job_id in [j.id for j in _jobs.values()
+                       if j.finished_at and (now - j.finished_at).total_seconds() > JOB_RETENTION]:
+            del _jobs[job_id]
+
+
+def submit_plan_job(coach_email: str, client_email: str, summary: str, num_days: int,
+                    use_cache: bool = True) -> PlanJob:
+    """
+    Queue plan generation for a client and return the job to poll.
+    """
+    _prune()
+    job = PlanJob(coach_email, client_email, num_days)
+    with _jobs_lock:
+        _jobs[job.id] = job
+    _executor.submit(_run_plan_job, job, summary, use_cache)
+    return job
+
+
+def submit_bulk_plan_job(coach_email: str, items: List[Tuple[str, str]], num_days: int,
+                         use_cache: bool = True) -> PlanJob:
+    """
+    Queue plan generation for many (client email, transcript) pairs as one job.
+    """
+    _prune()
+    job = PlanJob(coach_email, None, num_days, client_count=len(items))
+    with _jobs_lock:
+        _jobs[job.id] = job
+    _executor.submit(_run_bulk_plan_job, job, items, use_cache)
+    return job
+
+
+def get_job(job_id: str) -> Optional[PlanJob]:
+    with _jobs_lock:
+        return _jobs.get(job_id)
+
+
+def list_jobs(coach_email: str) -> List[PlanJob]:
+    """
+    A coach's jobs, newest first.
+    """
+    with _jobs_lock:
+        jobs = [j for j in _jobs.values() if j.coach_email == coach_email]
+    return sorted(jobs, key=lambda j: j.created_at, reverse=True)
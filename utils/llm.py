@@ -1,26 +1,401 @@
-from types import CoroutineType
-from typing import Any
+import os
+import queue
+import threading
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, Iterator, List, Optional, Tuple, TypeVar
 from dotenv import load_dotenv
 
 import asyncio
 
-from utils.utils import run_async
+from utils import llm_cache
+from utils.fake_llm import create_fake_model
+from utils.resilience import (
+    CircuitBreaker, CircuitOpenError, LatencyTracker, first_token_within, hedged, is_retryable,
+)
+from utils.routing import get_route
+from utils.telemetry import track_llm_call
+from utils.utils import run_async, submit_async
 
 from pydantic import BaseModel
 from pydantic_ai import Agent
 from pydantic_ai.agent import AgentRunResult
+from pydantic_ai.messages import (
+    ModelMessage, ModelRequest, ModelResponse, SystemPromptPart, TextPart, UserPromptPart,
+)
+from pydantic_ai.models import Model
 from pydantic_ai.providers.google import GoogleProvider
-from pydantic_ai.models.google import GoogleModel, GoogleModelSettings
+from pydantic_ai.models.google import GoogleModel
+from tenacity import AsyncRetrying, retry_if_exception, stop_after_attempt, stop_after_delay, wait_random_exponential
 
 load_dotenv()
 
-provider = GoogleProvider()
-model_settings = GoogleModelSettings(google_thinking_config={'thinking_budget': 0})
-model = GoogleModel('gemini-2.5-flash', provider=provider)
-agent = Agent(model, model_settings=model_settings)
+T = TypeVar("T")
 
-async def _run_async(prompt: str, output_type: BaseModel):
-    return await agent.run(prompt, output_type=output_type)
+# "google" calls Gemini; "fake" answers every route with the offline stand-in
+# from utils/fake_llm.py. Which model each call site uses is in utils/routing.py
+LLM_BACKEND = os.getenv("LLM_BACKEND", "google").lower()
 
-def llm_async(prompt: str, output_type: BaseModel) -> AgentRunResult[str]:
-    return agent.run_sync(prompt, output_type=output_type)
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", 8))
+
+# Overall deadline per call (all attempts), and the cap on any single attempt
+LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT", 60))
+LLM_ATTEMPT_TIMEOUT = float(os.getenv("LLM_ATTEMPT_TIMEOUT", 25))
+
+# Retryable failures (timeouts, 429s, 5xx) are retried with jittered exponential backoff
+LLM_RETRY_ATTEMPTS = int(os.getenv("LLM_RETRY_ATTEMPTS", 3))
+LLM_RETRY_BACKOFF = float(os.getenv("LLM_RETRY_BACKOFF", 0.5))
+
+# Send a duplicate request once a call outlives its site's p95 latency
+LLM_HEDGE = os.getenv("LLM_HEDGE", "false").lower() in ("1", "true", "yes")
+
+# After this many consecutive failures of a model, stop calling it for the cooldown
+LLM_BREAKER_THRESHOLD = int(os.getenv("LLM_BREAKER_THRESHOLD", 5))
+LLM_BREAKER_COOLDOWN = float(os.getenv("LLM_BREAKER_COOLDOWN", 30))
+
+# Text reply served when the provider is failing and nothing is cached
+LLM_FALLBACK_TEXT = os.getenv(
+    "LLM_FALLBACK_TEXT",
+    "Your coach is having trouble responding right now. Please try again in a minute.",
+)
+
+if LLM_BACKEND not in ("google", "fake"):
+    raise ValueError(f"Unknown LLM_BACKEND '{LLM_BACKEND}', expected 'google' or 'fake'")
+
+# One provider (and so one HTTP client) for the process; its async calls all
+# run on the shared loop from utils.utils.get_event_loop. Not created for the
+# fake backend, so that runs without an API key.
+provider = GoogleProvider() if LLM_BACKEND == "google" else None
+
+_models: Dict[str, Model] = {}
+_models_lock = threading.Lock()
+_breakers: Dict[str, CircuitBreaker] = {}
+
+
+def get_model(name: str) -> Model:
+    """
+    The model for a routing-table name, created once and shared.
+    """
+    with _models_lock:
+        if name in _models:
+            return _models[name]
+        if LLM_BACKEND == "fake" or name.startswith("fake"):
+            _models[name] = create_fake_model(name if name.startswith("fake") else f"fake:{name}")
+        else:
+            _models[name] = GoogleModel(name, provider=provider)
+        return _models[name]
+
+
+# The model is chosen per run from the routing table
+agent = Agent(get_model(get_route("default").model))
+
+_semaphore = None
+_latency = LatencyTracker()
+
+
+def _get_semaphore() -> asyncio.Semaphore:
+    # Created on first use so it binds to the shared loop
+    global _semaphore
+    if _semaphore is None:
+        _semaphore = asyncio.Semaphore(LLM_MAX_CONCURRENCY)
+    return _semaphore
+
+
+def _get_breaker(model_name: str) -> CircuitBreaker:
+    return _breakers.setdefault(model_name, CircuitBreaker(LLM_BREAKER_THRESHOLD, LLM_BREAKER_COOLDOWN))
+
+
+async def _call_with_policy(run: Callable[[], Awaitable[T]], site: str, model_name: str, timeout: float,
+                            hedge: bool = True, retryable: Callable[[BaseException], bool] = is_retryable,
+                            first_token: Optional[asyncio.Event] = None) -> T:
+    """
+    Run one model call under that model's circuit breaker, an overall deadline,
+    jittered retries of retryable errors and (if LLM_HEDGE is on) p95 hedging.
+
+    For streams, pass the event set on the first token as `first_token`: the
+    deadline and attempt cap then only bound the wait for it, and the rest
+    of the stream runs under the caller's deadline.
+    """
+    breaker = _get_breaker(model_name)
+    if not breaker.allow():
+        raise CircuitOpenError(f"Circuit breaker for {model_name} is open")
+
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    latency_key = f"{site}:{model_name}"
+
+    async def attempt() -> T:
+        async with _get_semaphore():
+            started = loop.time()
+            result = await run()
+        _latency.record(latency_key, loop.time() - started)
+        return result
+
+    try:
+        async for retry in AsyncRetrying(
+            stop=stop_after_attempt(LLM_RETRY_ATTEMPTS) | stop_after_delay(timeout),
+            wait=wait_random_exponential(multiplier=LLM_RETRY_BACKOFF, max=8),
+            retry=retry_if_exception(retryable),
+            reraise=True,
+        ):
+            with retry:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    raise asyncio.TimeoutError()
+                cap = min(remaining, LLM_ATTEMPT_TIMEOUT)
+                if first_token is not None:
+                    result = await first_token_within(attempt(), first_token, cap)
+                else:
+                    hedge_after = _latency.p95(latency_key) if hedge and LLM_HEDGE else None
+                    result = await asyncio.wait_for(hedged(attempt, hedge_after), cap)
+    except asyncio.CancelledError:
+        breaker.release()
+        raise
+    except Exception as e:
+        # Only provider trouble counts against the breaker, not e.g. a bad request
+        if is_retryable(e):
+            breaker.record_failure()
+        else:
+            breaker.release()
+        raise
+
+    breaker.record_success()
+    return result
+
+
+def _is_provider_failure(exc: BaseException) -> bool:
+    return isinstance(exc, CircuitOpenError) or is_retryable(exc)
+
+
+async def _call_routed(run: Callable[[Model, dict], Awaitable[T]], site: str, timeout: float,
+                       hedge: bool = True,
+                       retryable: Callable[[BaseException], bool] = is_retryable,
+                       first_token: Optional[asyncio.Event] = None) -> Tuple[T, str]:
+    """
+    Call the site's routed model under _call_with_policy, moving on to its
+    fallback models in order while they time out or fail. Returns the result
+    and the name of the model that produced it.
+
+    With `first_token` (streams), a route's per-model timeout only bounds the
+    time to first token.
+    """
+    route = get_route(site)
+    settings = route.model_settings()
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+
+    names = route.models
+    for i, name in enumerate(names):
+        remaining = deadline - loop.time()
+        is_last = i == len(names) - 1
+        budget = remaining if is_last or route.timeout is None else min(remaining, route.timeout)
+        try:
+            result = await _call_with_policy(lambda: run(get_model(name), settings), site, name, budget,
+                                             hedge=hedge, retryable=retryable, first_token=first_token)
+            return result, get_model(name).model_name
+        except Exception as e:
+            moving_on = isinstance(e, CircuitOpenError) or retryable(e)
+            if is_last or not moving_on or deadline - loop.time() <= 0:
+                raise
+
+
+def _cache_key(prompt: str, message_history: Optional[List[ModelMessage]], site: str,
+               output_type) -> Optional[str]:
+    """
+    The response cache key for a call, or None if it can't be cached.
+
+    A history holding only the system prompt (a chat's opening message) is
+    keyed on that system prompt plus the prompt; once it holds earlier turns
+    the call is never cached.
+    """
+    parts = [part for message in message_history or [] for part in message.parts]
+    if not all(isinstance(part, SystemPromptPart) for part in parts):
+        return None
+    route = get_route(site)
+    return llm_cache.cache_key("\n\n".join([*(part.content for part in parts), prompt]),
+                               get_model(route.model).model_name, route.model_settings(), output_type)
+
+
+def _fallback(key: Optional[str], output_type) -> Optional[llm_cache.CachedRunResult]:
+    """
+    A degraded answer for when the provider is failing: any cached output for
+    the same request regardless of age, else canned text for text replies.
+    """
+    if key is not None:
+        cached = llm_cache.get(key, output_type, max_age=float("inf"))
+        if cached is not None:
+            cached.fallback = True
+            return cached
+    if output_type is None or output_type is str:
+        return llm_cache.CachedRunResult(LLM_FALLBACK_TEXT, cached=False, fallback=True)
+    return None
+
+
+async def llm_run(prompt: str, output_type: BaseModel, use_cache: bool = True,
+                  timeout: float = LLM_TIMEOUT,
+                  message_history: Optional[List[ModelMessage]] = None,
+                  site: str = "default") -> AgentRunResult[Any]:
+    """
+    Run a prompt through the agent without blocking the loop, reusing a cached
+    output for an identical prompt, route and output type.
+
+    The model comes from the routing table entry for `site` (utils/routing.py),
+    which also labels the call in the metrics recorded by utils/telemetry.py.
+
+    At most LLM_MAX_CONCURRENCY calls are in flight at once. Timeouts and
+    transient provider errors are retried, then handed to the route's
+    fallback models, until `timeout` seconds have passed; if every model keeps
+    failing, a stale cached output or canned text reply is returned (with
+    .fallback set) and otherwise the error is raised. Calls whose
+    `message_history` holds earlier turns are never cached.
+    """
+    key = _cache_key(prompt, message_history, site, output_type)
+    use_cache = use_cache and key is not None
+
+    with track_llm_call(site, get_model(get_route(site).model).model_name) as call:
+        if use_cache:
+            cached = await asyncio.to_thread(llm_cache.get, key, output_type)
+            if cached is not None:
+                call.cached = True
+                return cached
+
+        try:
+            result, call.model = await _call_routed(
+                lambda model, settings: agent.run(prompt, output_type=output_type, message_history=message_history,
+                                                  model=model, model_settings=settings),
+                site, timeout,
+            )
+        except Exception as e:
+            fallback = await asyncio.to_thread(_fallback, key, output_type) \
+                if _is_provider_failure(e) else None
+            if fallback is None:
+                raise
+            call.error = type(e).__name__
+            call.cached = fallback.cached
+            call.fallback = "cache" if fallback.cached else "canned"
+            return fallback
+        call.set_usage(result.usage())
+
+    if use_cache:
+        await asyncio.to_thread(llm_cache.put, key, result.output)
+    return result
+
+
+async def llm_gather(*calls: Awaitable) -> List:
+    """
+    Await several llm_run calls concurrently and return their results in order.
+    """
+    return list(await asyncio.gather(*calls))
+
+
+def llm_async(prompt: str, output_type: BaseModel, use_cache: bool = True,
+              timeout: float = LLM_TIMEOUT, site: str = "default") -> AgentRunResult[Any]:
+    """
+    Blocking wrapper around llm_run for the Streamlit script thread.
+    """
+    return run_async(llm_run(prompt, output_type, use_cache=use_cache, timeout=timeout, site=site))
+
+
+@dataclass
+class _StreamDone:
+    messages: List[ModelMessage]
+    fallback: bool = False
+
+
+async def _stream_into(chunks: queue.Queue, prompt: str, timeout: float,
+                       message_history: Optional[List[ModelMessage]], site: str, key: Optional[str]) -> None:
+    started = asyncio.Event()
+
+    async def run(model: Model, settings: dict):
+        async with agent.run_stream(prompt, message_history=message_history,
+                                    model=model, model_settings=settings) as result:
+            # No debounce: hand each delta over as soon as it arrives
+            async for delta in result.stream_text(delta=True, debounce_by=None):
+                started.set()
+                call.first_token()
+                chunks.put(delta)
+        return result
+
+    with track_llm_call(site, get_model(get_route(site).model).model_name, streamed=True) as call:
+        try:
+            # Text already shown can't be taken back, so only retry or fall
+            # back to another model before the first token. Per-attempt and
+            # per-model timeouts bound only the wait for that token; `timeout`
+            # bounds the whole stream.
+            result, call.model = await asyncio.wait_for(_call_routed(
+                run, site, timeout, hedge=False,
+                retryable=lambda e: not started.is_set() and is_retryable(e),
+                first_token=started,
+            ), timeout)
+            call.set_usage(result.usage())
+            chunks.put(_StreamDone(result.new_messages()))
+        except Exception as e:
+            if started.is_set() and _is_provider_failure(e):
+                # Keep the partial reply on screen, but don't persist it
+                call.error = type(e).__name__
+                chunks.put(_StreamDone([], fallback=True))
+                return
+            fallback = await asyncio.to_thread(_fallback, key, None) \
+                if _is_provider_failure(e) else None
+            if fallback is None:
+                chunks.put(e)
+                raise
+            call.error = type(e).__name__
+            call.cached = fallback.cached
+            call.fallback = "cache" if fallback.cached else "canned"
+            chunks.put(fallback.output)
+            chunks.put(_StreamDone([], fallback=True))
+
+
+def llm_stream(prompt: str, use_cache: bool = True, timeout: float = LLM_TIMEOUT,
+               message_history: Optional[List[ModelMessage]] = None,
+               on_complete: Optional[Callable[[List[ModelMessage]], None]] = None,
+               site: str = "default") -> Iterator[str]:
+    """
+    Yield a text reply chunk by chunk as the model produces it, for st.write_stream.
+
+    The stream runs on the shared loop; the full text is cached once it
+    completes, and a cache hit is yielded as a single chunk. Calls whose
+    `message_history` holds earlier turns are never cached; pass
+    `on_complete` to receive the run's new messages once the stream ends
+    (for a cache hit, the prompt and cached reply).
+
+    Failures before the first token are retried and routed to fallback models
+    like llm_run, and then fall back to a cached or canned reply. A stream
+    that fails or runs past `timeout` after its first token just ends early.
+    In both cases nothing is cached and on_complete is not called.
+    """
+    key = _cache_key(prompt, message_history, site, None)
+    use_cache = use_cache and key is not None
+    if use_cache:
+        cached = llm_cache.get(key, None)
+        if cached is not None:
+            with track_llm_call(site, get_model(get_route(site).model).model_name, streamed=True) as call:
+                call.cached = True
+            yield cached.output
+            if on_complete is not None:
+                on_complete([ModelRequest(parts=[UserPromptPart(prompt)]),
+                             ModelResponse(parts=[TextPart(cached.output)])])
+            return
+
+    chunks = queue.Queue()
+    future = submit_async(_stream_into(chunks, prompt, timeout, message_history, site, key))
+    text = []
+    try:
+        while True:
+            chunk = chunks.get()
+            if isinstance(chunk, _StreamDone):
+                break
+            if isinstance(chunk, Exception):
+                raise chunk
+            text.append(chunk)
+            yield chunk
+    finally:
+        # Stops the model call if the consumer goes away mid-stream
+        future.cancel()
+
+    if chunk.fallback:
+        return
+    if use_cache:
+        llm_cache.put(key, "".join(text))
+    if on_complete is not None:
+        on_complete(chunk.messages)
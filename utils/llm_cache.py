@@ -0,0 +1,166 @@
+"""
+Content-addressed, disk-backed cache of LLM outputs.
+
+Entries are keyed on the prompt, model name, model settings and output
+schema, and stored in a SQLite file so every Streamlit session and process
+on the host shares them. Entries expire after LLM_CACHE_TTL seconds but are
+kept as fallback answers (see utils/llm.py) until the stored outputs exceed
+LLM_CACHE_MAX_BYTES; then expired entries go first, followed by the least
+recently used.
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Any, Optional
+
+from pydantic import BaseModel
+from pydantic_ai.usage import Usage
+
+LLM_CACHE_PATH = os.getenv("LLM_CACHE_PATH", os.path.join(".cache", "llm_cache.sqlite3"))
+LLM_CACHE_TTL = int(os.getenv("LLM_CACHE_TTL", 7 * 24 * 3600))
+LLM_CACHE_MAX_BYTES = int(os.getenv("LLM_CACHE_MAX_BYTES", 50 * 1024 * 1024))
+
+_init_lock = threading.Lock()
+_initialised = False
+
+
+@dataclass
+class CachedRunResult:
+    """
+    Stand-in for AgentRunResult when the output comes from the cache (or, with
+    fallback=True, is a degraded answer served while the provider is failing).
+    """
+    output: Any
+    cached: bool = True
+    fallback: bool = False
+
+    def usage(self) -> Usage:
+        return Usage()
+
+
+@contextmanager
+def _connect():
+    """
+    Open the cache database, run the block in one transaction and close it.
+    """
+    global _initialised
+    os.makedirs(os.path.dirname(LLM_CACHE_PATH) or ".", exist_ok=True)
+    conn = sqlite3.connect(LLM_CACHE_PATH, timeout=10)
+    if not _initialised:
+        with _init_lock:
+            if not _initialised:
+                conn.execute("PRAGMA journal_mode=WAL")
+                conn.execute("""
+                    CREATE TABLE IF NOT EXISTS llm_cache (
+                        key TEXT PRIMARY KEY,
+                        output TEXT NOT NULL,
+                        size INTEGER NOT NULL,
+                        created_at REAL NOT NULL,
+                        last_used REAL NOT NULL
+                    )
+                """)
+                conn.execute("CREATE INDEX IF NOT EXISTS llm_cache_last_used ON llm_cache (last_used)")
+                conn.commit()
+                _initialised = True
+    try:
+        with conn:
+            yield conn
+    finally:
+        conn.close()
+
+
+def _schema(output_type) -> Any:
+    if output_type is None or output_type is str:
+        return "str"
+    if isinstance(output_type, type) and issubclass(output_type, BaseModel):
+        return output_type.model_json_schema()
+    return repr(output_type)
+
+
+def cache_key(prompt: str, model_name: str, model_settings: Optional[dict], output_type) -> str:
+    payload = json.dumps(
+        {
+            "prompt": prompt,
+            "model": model_name,
+            "settings": model_settings or {},
+            "schema": _schema(output_type),
+        },
+        sort_keys=True, default=str,
+    )
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def _dump(output) -> str:
+    if isinstance(output, BaseModel):
+        return output.model_dump_json()
+    return json.dumps(output)
+
+
+def _load(raw: str, output_type):
+    if isinstance(output_type, type) and issubclass(output_type, BaseModel):
+        return output_type.model_validate_json(raw)
+    return json.loads(raw)
+
+
+def get(key: str, output_type, max_age: Optional[float] = None) -> Optional[CachedRunResult]:
+    """
+    Return the cached result for `key`, or None on a miss or expired entry.
+
+    `max_age` overrides LLM_CACHE_TTL for this lookup; a longer one (as for
+    fallback answers) reads entries the normal TTL would treat as expired.
+    """
+    now = time.time()
+    ttl = LLM_CACHE_TTL if max_age is None else max_age
+    with _connect() as conn:
+        row = conn.execute("SELECT output, created_at FROM llm_cache WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        # Expired rows are left for _evict, so they can still serve as fallbacks
+        if now - row[1] > ttl:
+            return None
+        conn.execute("UPDATE llm_cache SET last_used = ? WHERE key = ?", (now, key))
+
+    try:
+        return CachedRunResult(_load(row[0], output_type))
+    except ValueError:
+        return None  # schema changed since the entry was written
+
+
+def put(key: str, output) -> None:
+    raw = _dump(output)
+    now = time.time()
+    with _connect() as conn:
+        conn.execute(
+            "INSERT OR REPLACE INTO llm_cache (key, output, size, created_at, last_used) VALUES (?, ?, ?, ?, ?)",
+            (key, raw, len(raw), now, now),
+        )
+        _evict(conn, now)
+
+
+def _evict(conn: sqlite3.Connection, now: float) -> None:
+    # Expired entries stay around as fallback answers until space is needed
+    total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM llm_cache").fetchone()[0]
+    if total <= LLM_CACHE_MAX_BYTES:
+        return
+
+    conn.execute("DELETE FROM llm_cache WHERE created_at < ?", (now - LLM_CACHE_TTL,))
+    total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM llm_cache").fetchone()[0]
+    if total <= LLM_CACHE_MAX_BYTES:
+        return
+
+    # Drop least recently used entries until back under the cap
+    for key, size in conn.execute("SELECT key, size FROM llm_cache ORDER BY last_used").fetchall():
+        conn.execute("DELETE FROM llm_cache WHERE key = ?", (key,))
+        total -= size
+        if total <= LLM_CACHE_MAX_BYTES:
+            break
+
+
+def clear() -> None:
+    with _connect() as conn:
+        conn.execute("DELETE FROM llm_cache")
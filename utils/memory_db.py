@@ -0,0 +1,646 @@
+"""
+In-process stand-in for the subset of the Firestore client API used by utils/db.py.
+
+Documents live in a dict keyed by their full path, so subcollections behave
+as in Firestore: they exist independently of their parent document and a
+query only sees documents directly inside its collection. Writes accept the
+same dotted field paths and sentinels (DELETE_FIELD, ArrayUnion, ...) as the
+real client.
+"""
+import copy
+import functools
+import json
+import queue
+import secrets
+import string
+import threading
+import traceback
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterable, List, Optional, Tuple, Union
+
+from google.api_core.exceptions import NotFound
+from google.cloud.firestore_v1 import transforms
+from google.cloud.firestore_v1.base_query import FieldFilter
+
+_ID_ALPHABET = string.ascii_letters + string.digits
+_NAME = "__name__"
+
+
+def _new_id() -> str:
+    return "".join(secrets.choice(_ID_ALPHABET) for _ in range(20))
+
+
+def _get_field(data: dict, path: str) -> Tuple[bool, Any]:
+    target = data
+    for key in path.split("."):
+        if not isinstance(target, dict) or key not in target:
+            return False, None
+        target = target[key]
+    return True, target
+
+
+def _write_value(target: dict, key: str, value: Any) -> None:
+    if value is transforms.DELETE_FIELD:
+        target.pop(key, None)
+    elif value is transforms.SERVER_TIMESTAMP:
+        target[key] = datetime.now(timezone.utc)
+    elif isinstance(value, transforms.ArrayUnion):
+        items = list(target.get(key) or [])
+        items.extend(copy.deepcopy(v) for v in value.values if v not in items)
+        target[key] = items
+    elif isinstance(value, transforms.ArrayRemove):
+        target[key] = [v for v in target.get(key) or [] if v not in value.values]
+    elif isinstance(value, transforms.Increment):
+        target[key] = (target.get(key) or 0) + value.value
+    elif isinstance(value, transforms.Maximum):
+        target[key] = max(target.get(key, value.value), value.value)
+    elif isinstance(value, transforms.Minimum):
+        target[key] = min(target.get(key, value.value), value.value)
+    else:
+        target[key] = copy.deepcopy(value)
+
+
+def _apply_write(data: dict, path: str, value: Any) -> None:
+    """
+    Write `value` at a dotted field path, as `update()` does.
+    """
+    *parents, leaf = path.split(".")
+    target = data
+    for key in parents:
+        if not isinstance(target.get(key), dict):
+            target[key] = {}
+        target = target[key]
+    _write_value(target, leaf, value)
+
+
+def _merge(target: dict, updates: dict) -> None:
+    """
+    Deep-merge `updates` into `target`, as `set(merge=True)` does. Keys are
+    literal field names here, not dotted paths.
+    """
+    for key, value in updates.items():
+        if isinstance(value, dict) and value:
+            if not isinstance(target.get(key), dict):
+                target[key] = {}
+            _merge(target[key], value)
+        else:
+            _write_value(target, key, value)
+
+
+# Firestore's cross-type ordering: null < bool < number < string < ... < map
+def _type_rank(value: Any) -> int:
+    if value is None:
+        return 0
+    if isinstance(value, bool):
+        return 1
+    if isinstance(value, (int, float)):
+        return 2
+    if isinstance(value, datetime):
+        return 3
+    if isinstance(value, str):
+        return 4
+    if isinstance(value, MemoryDocumentReference):
+        return 5
+    if isinstance(value, list):
+        return 6
+    return 7
+
+
+def _compare(a: Any, b: Any) -> int:
+    rank_a, rank_b = _type_rank(a), _type_rank(b)
+    if rank_a != rank_b:
+        return -1 if rank_a < rank_b else 1
+    if isinstance(a, MemoryDocumentReference):
+        a, b = a.path, b.path
+    elif isinstance(a, dict):
+        a, b = json.dumps(a, sort_keys=True, default=str), json.dumps(b, sort_keys=True, default=str)
+    if a == b:
+        return 0
+    return -1 if a < b else 1
+
+
+_OPERATORS = {
+    "==": lambda v, x: _compare(v, x) == 0,
+    "!=": lambda v, x: _compare(v, x) != 0,
+    "<": lambda v, x: _type_rank(v) == _type_rank(x) and _compare(v, x) < 0,
+    "<=": lambda v, x: _type_rank(v) == _type_rank(x) and _compare(v, x) <= 0,
+    ">": lambda v, x: _type_rank(v) == _type_rank(x) and _compare(v, x) > 0,
+    ">=": lambda v, x: _type_rank(v) == _type_rank(x) and _compare(v, x) >= 0,
+    "in": lambda v, x: any(_compare(v, i) == 0 for i in x),
+    "not-in": lambda v, x: all(_compare(v, i) != 0 for i in x),
+    "array_contains": lambda v, x: isinstance(v, list) and x in v,
+    "array-contains": lambda v, x: isinstance(v, list) and x in v,
+    "array_contains_any": lambda v, x: isinstance(v, list) and any(i in v for i in x),
+    "array-contains-any": lambda v, x: isinstance(v, list) and any(i in v for i in x),
+}
+
+
+class MemoryDocumentSnapshot:
+    def __init__(self, reference: "MemoryDocumentReference", data: Optional[dict],
+                 field_paths: Optional[Iterable[str]] = None):
+        self.reference = reference
+        self.id = reference.id
+        self.exists = data is not None
+        self._data = data
+        self._field_paths = list(field_paths) if field_paths is not None else None
+
+    def to_dict(self) -> Optional[dict]:
+        if self._data is None:
+            return None
+        if self._field_paths is None:
+            return copy.deepcopy(self._data)
+
+        projected = {}
+        for path in self._field_paths:
+            found, value = _get_field(self._data, path)
+            if found:
+                _apply_write(projected, path, value)
+        return projected
+
+    def get(self, field_path: str) -> Any:
+        found, value = _get_field(self._data or {}, field_path)
+        if not found:
+            raise KeyError(field_path)
+        return copy.deepcopy(value)
+
+    def _order_value(self, field: str) -> Tuple[bool, Any]:
+        if field == _NAME:
+            return True, self.reference
+        return _get_field(self._data or {}, field)
+
+
+class MemoryDocumentReference:
+    def __init__(self, client: "MemoryClient", path: Tuple[str, ...]):
+        self._client = client
+        self._path = path
+        self.id = path[-1]
+
+    @property
+    def path(self) -> str:
+        return "/".join(self._path)
+
+    @property
+    def parent(self) -> "MemoryCollectionReference":
+        return MemoryCollectionReference(self._client, self._path[:-1])
+
+    def __eq__(self, other) -> bool:
+        return isinstance(other, MemoryDocumentReference) and other._path == self._path
+
+    def __hash__(self) -> int:
+        return hash(self._path)
+
+    def collection(self, collection_id: str) -> "MemoryCollectionReference":
+        return MemoryCollectionReference(self._client, self._path + (collection_id,))
+
+    def get(self, field_paths: Optional[Iterable[str]] = None, transaction=None) -> MemoryDocumentSnapshot:
+        with self._client._lock:
+            data = self._client._docs.get(self._path)
+            return MemoryDocumentSnapshot(self, copy.deepcopy(data), field_paths)
+
+    def set(self, document_data: dict, merge: bool = False) -> None:
+        with self._client._lock:
+            self._client._set(self._path, document_data, merge)
+        self._client._notify()
+
+    def create(self, document_data: dict) -> None:
+        with self._client._lock:
+            if self._path in self._client._docs:
+                raise ValueError(f"Document already exists: {self.path}")
+            self._client._set(self._path, document_data, False)
+        self._client._notify()
+
+    def update(self, field_updates: dict) -> None:
+        with self._client._lock:
+            self._client._update(self._path, field_updates)
+        self._client._notify()
+
+    def delete(self) -> None:
+        with self._client._lock:
+            self._client._delete(self._path)
+        self._client._notify()
+
+    def on_snapshot(self, callback) -> "MemoryWatch":
+        """
+        Call `callback(docs, changes, read_time)` now and after every write
+        to this document, like Firestore's listener.
+        """
+        watch = MemoryWatch(self, callback)
+        with self._client._lock:
+            self._client._listeners.setdefault(self._path, []).append(watch)
+        self._client._dispatch([watch])
+        return watch
+
+
+class MemoryWatch:
+    def __init__(self, reference: MemoryDocumentReference, callback):
+        self._reference = reference
+        self._callback = callback
+
+    def _fire(self) -> None:
+        with self._reference._client._lock:
+            if self not in self._reference._client._listeners.get(self._reference._path, []):
+                return
+        snapshot = self._reference.get()
+        self._callback([snapshot], [], datetime.now(timezone.utc))
+
+    def unsubscribe(self) -> None:
+        with self._reference._client._lock:
+            watches = self._reference._client._listeners.get(self._reference._path, [])
+            if self in watches:
+                watches.remove(self)
+
+
+class MemoryQuery:
+    def __init__(self, client: "MemoryClient", path: Tuple[str, ...]):
+        self._client = client
+        self._path = path
+        self._filters: List[Tuple[str, str, Any]] = []
+        self._orders: List[Tuple[str, str]] = []
+        self._projection: Optional[List[str]] = None
+        self._limit: Optional[int] = None
+        self._start_after = None
+
+    def _copy(self) -> "MemoryQuery":
+        query = copy.copy(self)
+        query._filters = list(self._filters)
+        query._orders = list(self._orders)
+        return query
+
+    def where(self, field_path: Optional[str] = None, op_string: Optional[str] = None,
+              value: Any = None, *, filter: Optional[FieldFilter] = None) -> "MemoryQuery":
+        if filter is not None:
+            field_path, op_string, value = filter.field_path, filter.op_string, filter.value
+        query = self._copy()
+        query._filters.append((str(field_path), op_string, value))
+        return query
+
+    def order_by(self, field_path: str, direction: str = "ASCENDING") -> "MemoryQuery":
+        query = self._copy()
+        query._orders.append((str(field_path), direction))
+        return query
+
+    def select(self, field_paths: Iterable[str]) -> "MemoryQuery":
+        query = self._copy()
+        query._projection = list(field_paths)
+        return query
+
+    def limit(self, count: int) -> "MemoryQuery":
+        query = self._copy()
+        query._limit = count
+        return query
+
+    def start_after(self, document_fields_or_snapshot) -> "MemoryQuery":
+        query = self._copy()
+        query._start_after = document_fields_or_snapshot
+        return query
+
+    def _sort_spec(self) -> List[Tuple[str, str]]:
+        orders = list(self._orders)
+        if all(field != _NAME for field, _ in orders):
+            orders.append((_NAME, orders[-1][1] if orders else "ASCENDING"))
+        return orders
+
+    def _cursor_values(self, orders: List[Tuple[str, str]]) -> List[Any]:
+        cursor = self._start_after
+        if isinstance(cursor, MemoryDocumentSnapshot):
+            return [cursor._order_value(field)[1] for field, _ in orders]
+
+        values = []
+        for field, _ in orders:
+            if field not in cursor:
+                break
+            value = cursor[field]
+            if field == _NAME and isinstance(value, str):
+                value = MemoryDocumentReference(self._client, self._path + (value,))
+            values.append(value)
+        return values
+
+    def stream(self, transaction=None):
+        orders = self._sort_spec()
+
+        with self._client._lock:
+            snapshots = [
+                MemoryDocumentSnapshot(MemoryDocumentReference(self._client, path), copy.deepcopy(data))
+                for path, data in self._client._docs.items()
+                if path[:-1] == self._path
+            ]
+
+        results = []
+        for snap in snapshots:
+            ok = True
+            for field, op, value in self._filters:
+                found, current = snap._order_value(field)
+                if not found or not _OPERATORS[op](current, value):
+                    ok = False
+                    break
+            # Firestore only returns documents that have every order_by field
+            if ok and all(snap._order_value(field)[0] for field, _ in orders):
+                results.append(snap)
+
+        def _cmp(a, b):
+            for field, direction in orders:
+                result = _compare(a._order_value(field)[1], b._order_value(field)[1])
+                if result:
+                    return -result if direction == "DESCENDING" else result
+            return 0
+
+        results.sort(key=functools.cmp_to_key(_cmp))
+
+        if self._start_after is not None:
+            cursor = self._cursor_values(orders)
+
+            def _after(snap) -> bool:
+                for (field, direction), value in zip(orders, cursor):
+                    result = _compare(snap._order_value(field)[1], value)
+                    if result:
+                        return (result < 0) if direction == "DESCENDING" else (result > 0)
+                return False
+
+            results = [snap for snap in results if _after(snap)]
+
+        if self._limit is not None:
+            results = results[:self._limit]
+
+        for snap in results:
+            if self._projection is not None:
+                snap = MemoryDocumentSnapshot(snap.reference, snap._data, self._projection)
+            yield snap
+
+    def get(self, transaction=None) -> List[MemoryDocumentSnapshot]:
+        return list(self.stream(transaction=transaction))
+
+
+class MemoryCollectionReference(MemoryQuery):
+    @property
+    def id(self) -> str:
+        return self._path[-1]
+
+    def document(self, document_id: Optional[str] = None) -> MemoryDocumentReference:
+        return MemoryDocumentReference(self._client, self._path + (document_id or _new_id(),))
+
+    def add(self, document_data: dict, document_id: Optional[str] = None):
+        ref = self.document(document_id)
+        ref.create(document_data)
+        return datetime.now(timezone.utc), ref
+
+    def list_documents(self) -> List[MemoryDocumentReference]:
+        with self._client._lock:
+            return [
+                MemoryDocumentReference(self._client, path)
+                for path in self._client._docs if path[:-1] == self._path
+            ]
+
+
+class MemoryWriteBatch:
+    def __init__(self, client: "MemoryClient"):
+        self._client = client
+        self._writes = []
+
+    def set(self, reference: MemoryDocumentReference, document_data: dict, merge: bool = False) -> None:
+        self._writes.append(("set", reference, copy.deepcopy(document_data), merge))
+
+    def update(self, reference: MemoryDocumentReference, field_updates: dict) -> None:
+        self._writes.append(("update", reference, field_updates, None))
+
+    def delete(self, reference: MemoryDocumentReference) -> None:
+        self._writes.append(("delete", reference, None, None))
+
+    def commit(self) -> None:
+        self._commit()
+        self._client._notify()
+
+    def _validate(self) -> None:
+        exists = {}
+        for op, reference, _, _ in self._writes:
+            path = reference._path
+            if op == "update" and not exists.get(path, path in self._client._docs):
+                raise NotFound(f"No document to update: {'/'.join(path)}")
+            exists[path] = op != "delete"
+
+    def _commit(self) -> None:
+        with self._client._lock:
+            self._validate()
+            docs = self._client._docs
+            # Snapshot only the documents this batch touches, so anything that
+            # still fails part-way leaves no partial writes
+            touched = {reference._path for _, reference, _, _ in self._writes}
+            staged = {path: copy.deepcopy(docs[path]) for path in touched if path in docs}
+            dirty = set(self._client._dirty)
+            try:
+                for op, reference, data, merge in self._writes:
+                    if op == "set":
+                        self._client._set(reference._path, data, merge)
+                    elif op == "update":
+                        self._client._update(reference._path, data)
+                    else:
+                        self._client._delete(reference._path)
+            except Exception:
+                for path in touched:
+                    if path in staged:
+                        docs[path] = staged[path]
+                    else:
+                        docs.pop(path, None)
+                self._client._dirty = dirty
+                raise
+        self._writes = []
+
+
+class MemoryTransaction(MemoryWriteBatch):
+    """
+    Serialises transactional functions on the client's lock; writes are
+    buffered and applied together when the function returns.
+    """
+
+
+class MemoryClient:
+    def __init__(self, seed: Optional[Dict[str, dict]] = None):
+        self._lock = threading.RLock()
+        self._docs: Dict[Tuple[str, ...], dict] = {}
+        self._listeners: Dict[Tuple[str, ...], List[MemoryWatch]] = {}
+        self._dirty = set()
+        self._events = queue.Queue()
+        self._dispatcher = None
+        for path, data in (seed or {}).items():
+            self._docs[tuple(path.split("/"))] = copy.deepcopy(data)
+
+    @classmethod
+    def from_json(cls, filename: str) -> "MemoryClient":
+        """
+        Build a client from a JSON file mapping document paths
+        (e.g. "users/a@b.c") to document data.
+        """
+        with open(filename, "r", encoding="utf-8") as file:
+            return cls(json.load(file))
+
+    def dump(self) -> Dict[str, dict]:
+        with self._lock:
+            return {"/".join(path): copy.deepcopy(data) for path, data in self._docs.items()}
+
+    def collection(self, collection_id: str) -> MemoryCollectionReference:
+        return MemoryCollectionReference(self, tuple(collection_id.split("/")))
+
+    def document(self, document_path: str) -> MemoryDocumentReference:
+        return MemoryDocumentReference(self, tuple(document_path.split("/")))
+
+    def batch(self) -> MemoryWriteBatch:
+        return MemoryWriteBatch(self)
+
+    def transaction(self, **kwargs) -> MemoryTransaction:
+        return MemoryTransaction(self)
+
+    def get_all(self, references: Iterable[MemoryDocumentReference],
+                field_paths: Optional[Iterable[str]] = None, transaction=None):
+        for reference in references:
+            yield reference.get(field_paths=field_paths)
+
+    def _notify(self) -> None:
+        """
+        Fire listeners for documents written since the last call.
+        """
+        with self._lock:
+            watches = [w for path in self._dirty for w in self._listeners.get(path, [])]
+            self._dirty.clear()
+        if watches:
+            self._dispatch(watches)
+
+    def _dispatch(self, watches: List["MemoryWatch"]) -> None:
+        """
+        Deliver snapshots in order on a background thread, as Firestore does.
+        """
+        with self._lock:
+            if self._dispatcher is None:
+                self._dispatcher = threading.Thread(target=self._run_dispatcher, name="memory-db-listeners", daemon=True)
+                self._dispatcher.start()
+        for watch in watches:
+            self._events.put(watch)
+
+    def _run_dispatcher(self) -> None:
+        while True:
+            watch = self._events.get()
+            try:
+                watch._fire()
+            except Exception:
+                traceback.print_exc()
+
+    # --- write primitives, called with self._lock held ---
+
+    def _set(self, path: Tuple[str, ...], data: dict, merge: Union[bool, List[str]]) -> None:
+        self._dirty.add(path)
+        if not merge or path not in self._docs:
+            self._docs[path] = {}
+        if isinstance(merge, (list, tuple)):
+            # merge=[field paths]: replace just those fields, leave the rest
+            for field_path in merge:
+                found, value = _get_field(data, str(field_path))
+                if not found:
+                    raise ValueError(f"Merge field path {field_path} not found in data")
+                _apply_write(self._docs[path], str(field_path), value)
+            return
+        _merge(self._docs[path], data)
+
+    def _update(self, path: Tuple[str, ...], field_updates: dict) -> None:
+        if path not in self._docs:
+            raise NotFound(f"No document to update: {'/'.join(path)}")
+        self._dirty.add(path)
+        for field_path, value in field_updates.items():
+            _apply_write(self._docs[path], str(field_path), value)
+
+    def _delete(self, path: Tuple[str, ...]) -> None:
+        self._dirty.add(path)
+        self._docs.pop(path, None)
+
+
+def memory_transactional(to_wrap):
+    """
+    Counterpart of `firestore.transactional` for MemoryTransaction objects.
+    """
+    @functools.wraps(to_wrap)
+    def wrapper(transaction: MemoryTransaction, *args, **kwargs):
+        with transaction._client._lock:
+            result = to_wrap(transaction, *args, **kwargs)
+            transaction._commit()
+        transaction._client._notify()
+        return result
+    return wrapper
+
+
+# -------------------- asyncio adapters -------------------- #
+# Mirror the AsyncClient API over the same in-process store. Operations are
+# in-memory, so they run inline rather than on an executor.
+
+class AsyncMemoryDocumentReference:
+    def __init__(self, reference: MemoryDocumentReference):
+        self._reference = reference
+        self.id = reference.id
+
+    @property
+    def path(self) -> str:
+        return self._reference.path
+
+    def collection(self, collection_id: str) -> "AsyncMemoryCollectionReference":
+        return AsyncMemoryCollectionReference(self._reference.collection(collection_id))
+
+    async def get(self, field_paths: Optional[Iterable[str]] = None, transaction=None) -> MemoryDocumentSnapshot:
+        return self._reference.get(field_paths=field_paths)
+
+    async def set(self, document_data: dict, merge: bool = False) -> None:
+        self._reference.set(document_data, merge=merge)
+
+    async def update(self, field_updates: dict) -> None:
+        self._reference.update(field_updates)
+
+    async def delete(self) -> None:
+        self._reference.delete()
+
+
+class AsyncMemoryQuery:
+    def __init__(self, query: MemoryQuery):
+        self._query = query
+
+    def where(self, *args, **kwargs) -> "AsyncMemoryQuery":
+        return AsyncMemoryQuery(self._query.where(*args, **kwargs))
+
+    def order_by(self, *args, **kwargs) -> "AsyncMemoryQuery":
+        return AsyncMemoryQuery(self._query.order_by(*args, **kwargs))
+
+    def select(self, field_paths: Iterable[str]) -> "AsyncMemoryQuery":
+        return AsyncMemoryQuery(self._query.select(field_paths))
+
+    def limit(self, count: int) -> "AsyncMemoryQuery":
+        return AsyncMemoryQuery(self._query.limit(count))
+
+    def start_after(self, document_fields_or_snapshot) -> "AsyncMemoryQuery":
+        if isinstance(document_fields_or_snapshot, dict):
+            document_fields_or_snapshot = {
+                key: value._reference if isinstance(value, AsyncMemoryDocumentReference) else value
+                for key, value in document_fields_or_snapshot.items()
+            }
+        return AsyncMemoryQuery(self._query.start_after(document_fields_or_snapshot))
+
+    async def stream(self, transaction=None):
+        for snapshot in self._query.stream():
+            yield snapshot
+
+    async def get(self, transaction=None) -> List[MemoryDocumentSnapshot]:
+        return self._query.get()
+
+
+class AsyncMemoryCollectionReference(AsyncMemoryQuery):
+    def document(self, document_id: Optional[str] = None) -> AsyncMemoryDocumentReference:
+        return AsyncMemoryDocumentReference(self._query.document(document_id))
+
+
+class AsyncMemoryClient:
+    def __init__(self, client: MemoryClient):
+        self._client = client
+
+    def collection(self, collection_id: str) -> AsyncMemoryCollectionReference:
+        return AsyncMemoryCollectionReference(self._client.collection(collection_id))
+
+    def document(self, document_path: str) -> AsyncMemoryDocumentReference:
+        return AsyncMemoryDocumentReference(self._client.document(document_path))
+
+    async def get_all(self, references: Iterable[AsyncMemoryDocumentReference],
+                      field_paths: Optional[Iterable[str]] = None, transaction=None):
+        for reference in references:
+            yield reference._reference.get(field_paths=field_paths)
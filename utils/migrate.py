@@ -0,0 +1,17 @@
+"""
+Data migrations for documents written before the current layout. Each one
+skips users it has already migrated, so running this again is safe:
+
+    python -m utils.migrate
+
+- Legacy `checkins` arrays on user documents move to the checkins
+  subcollection, the only place get_recent_checkins and the check-in pages
+  read from.
+- Legacy `previousPlans` arrays move to the versioned plans subcollection,
+  so User no longer parses every past plan on each load.
+"""
+from utils.db import migrate_all_checkins, migrate_all_plan_histories
+
+if __name__ == "__main__":
+    print(f"Moved {migrate_all_checkins()} check-ins to the checkins subcollection")
+    print(f"Moved plan history to the plans subcollection for {migrate_all_plan_histories()} users")
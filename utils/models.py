@@ -74,20 +74,31 @@ class CheckinSummary(BaseModel):
     summary: Optional[str]
     timestamp: str
 
+class ClientSummary(BaseModel):
+    """
+    Lightweight client row for coach listings, built from a projected query.
+    """
+    email: str
+    name: str
+    active: bool = True
+    created_at: Optional[str] = None
+
 class User(BaseModel):
     email: str
     name: str
     role: Optional[str] = None  # Role might be None initially
     first_time_user: bool = True  # New flag to track onboarding status
+    coach_email: Optional[str] = None  # coach this client is assigned to
     created_at: str
     active: bool
 
     # Plan and goal-related
     currentPlan: Optional[Plan] = None
-    previousPlans: Optional[List[Plan]] = []
+    currentPlanVersion: Optional[int] = None  # version doc in users/{email}/plans
+    previousPlans: Optional[List[Plan]] = []  # legacy, history now lives in the plans subcollection
     main_goals: Optional[Dict[str, Goal]] = None
 
     # New additions for LLM chat context
     main_goal_context: Optional[Dict[str, str]] = None  # goal_id → summary
     coach_goal_context: Optional[Dict[str, str]] = None  # goal_id → summary
-    checkins: Optional[List[CheckinSummary]] = None  # raw + summary check-in data
+    checkins: Optional[List[CheckinSummary]] = None  # legacy array, now stored in the checkins subcollection
@@ -0,0 +1,160 @@
+import asyncio
+import io
+import json
+import os
+import zipfile
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional, Tuple
+
+from utils.db import get_clients, publish_plans
+from utils.llm import llm_async, llm_run
+from utils.models import GoalsLiteOnly, Plan
+from utils.utils import convert_goals, run_async
+
+# Upper bound on plan generations started per minute in bulk mode
+BULK_PLAN_RATE_PER_MINUTE = int(os.getenv("BULK_PLAN_RATE_PER_MINUTE", 60))
+
+
+def plan_prompt(summary: str, num_days: int) -> str:
+    return f"""
+            You are a personal AI assistant helping a coach design a {num_days}-day improvement plan for a client.
+
+            Based on the following coaching session summary, identify 5 distinct goals the client should work on, and label each with an importance level:
+            - 1 high importance goal
+            - 2 medium importance goals
+            - 2 low importance goals
+
+            Each goal should include a short, clear title and an actionable task (reflection, exercise, behavior, etc.).
+
+
+            SESSION SUMMARY:
+            {summary}
+            """
+
+
+def generate_plan(summary: str, num_days: int, use_cache: bool = True) -> Plan:
+    """
+    Ask the LLM for a plan's goals from a coaching session summary.
+    """
+    goals = convert_goals(llm_async(plan_prompt(summary, num_days), GoalsLiteOnly, use_cache=use_cache,
+                                    site="coach.plan").output)
+
+    plan = Plan()
+    plan.goals = goals
+    return plan
+
+
+class _RateLimiter:
+    """
+    Spaces call starts at least 60 / per_minute seconds apart.
+    """
+    def __init__(self, per_minute: int):
+        self.interval = 60 / per_minute
+        self._next = 0.0
+        self._lock = asyncio.Lock()
+
+    async def wait(self) -> None:
+        async with self._lock:
+            now = asyncio.get_running_loop().time()
+            delay = self._next - now
+            self._next = max(now, self._next) + self.interval
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+
+@dataclass
+class BulkPlanResult:
+    client_email: str
+    ok: bool
+    detail: str
+
+
+def parse_bulk_upload(filename: str, data: bytes) -> List[Tuple[str, str]]:
+    """
+    Read (client email, transcript) pairs from either a JSONL file with
+    `client` and `transcript` keys on each line, or a zip of
+    `<client email>.txt` files.
+    """
+    pairs = []
+    if filename.lower().endswith(".zip"):
+        try:
+            with zipfile.ZipFile(io.BytesIO(data)) as archive:
+                for name in sorted(archive.namelist()):
+                    stem, ext = os.path.splitext(os.path.basename(name))
+                    if ext.lower() in (".txt", ".md") and not name.startswith("__MACOSX/"):
+                        pairs.append((stem.strip(), archive.read(name).decode("utf-8")))
+        except zipfile.BadZipFile:
+            raise ValueError(f"{filename} is not a valid zip file")
+        return pairs
+
+    for line_no, line in enumerate(data.decode("utf-8").splitlines(), start=1):
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+            pairs.append((row["client"].strip(), row["transcript"]))
+        except (ValueError, KeyError, TypeError, AttributeError):
+            raise ValueError(f"Line {line_no}: expected a JSON object with 'client' and 'transcript'")
+    return pairs
+
+
+def generate_bulk_plans(coach_email: str, items: List[Tuple[str, str]], num_days: int,
+                        use_cache: bool = True,
+                        on_progress: Optional[Callable[[int, int], None]] = None) -> List[BulkPlanResult]:
+    """
+    Generate plans for many (client email, transcript) pairs at once.
+
+    Goal extraction runs concurrently, started no faster than
+    BULK_PLAN_RATE_PER_MINUTE; the finished plans are then saved together with
+    publish_plans. Returns one result per input pair, in input order.
+    """
+    results: Dict[int, BulkPlanResult] = {}
+    todo = {}  # client email -> (position, transcript)
+    for position, (email, transcript) in enumerate(items):
+        if email in todo:
+            results[position] = BulkPlanResult(email, False, "Duplicate entry; only the first was used")
+        elif not transcript.strip():
+            results[position] = BulkPlanResult(email, False, "Empty transcript")
+        else:
+            todo[email] = (position, transcript)
+
+    clients = get_clients(coach_email, todo)
+    for email in [e for e in todo if e not in clients]:
+        results[todo.pop(email)[0]] = BulkPlanResult(email, False, "Not one of your clients")
+
+    limiter = _RateLimiter(BULK_PLAN_RATE_PER_MINUTE)
+    finished = 0
+
+    async def _generate(transcript: str) -> Plan:
+        nonlocal finished
+        await limiter.wait()
+        try:
+            output = (await llm_run(plan_prompt(transcript, num_days), GoalsLiteOnly, use_cache=use_cache,
+                                   site="coach.plan_bulk")).output
+        finally:
+            finished += 1
+            if on_progress is not None:
+                on_progress(finished, len(todo))
+        return Plan(goals=convert_goals(output))
+
+    async def _generate_all() -> list:
+        return await asyncio.gather(*(_generate(todo[email][1]) for email in emails), return_exceptions=True)
+
+    emails = list(todo)
+    plans = run_async(_generate_all())
+
+    generated = {}
+    for email, plan in zip(emails, plans):
+        if isinstance(plan, Exception):
+            results[todo[email][0]] = BulkPlanResult(email, False, f"Generation failed: {str(plan) or type(plan).__name__}")
+        else:
+            generated[email] = plan
+
+    saved = publish_plans({email: plan.model_dump() for email, plan in generated.items()})
+    for email, plan in generated.items():
+        if saved.get(email):
+            results[todo[email][0]] = BulkPlanResult(email, True, f"{len(plan.goals)} goals saved")
+        else:
+            results[todo[email][0]] = BulkPlanResult(email, False, "Saving the plan failed")
+
+    return [results[position] for position in sorted(results)]
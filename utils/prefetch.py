@@ -0,0 +1,189 @@
+"""
+Opening check-in questions generated ahead of time.
+
+When a client's dashboard loads (or from a scheduled batch, see
+prefetch_all_checkin_questions) the opening questions for each of today's
+scheduled goals are generated in parallel and stored with an expiry, so
+opening a check-in chat needs no LLM round trip.
+"""
+import asyncio
+import datetime
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+from utils import db_async
+from utils.chat import ChatSession
+from utils.context import get_prompt_context_async
+from utils.db import (
+    get_all_prefetched_questions, get_client_plans, get_prefetched_questions, save_prefetched_questions,
+)
+from utils.llm import llm_run
+from utils.models import Plan
+from utils.utils import run_async
+
+CHECKIN_PREFETCH_TTL = int(os.getenv("CHECKIN_PREFETCH_TTL", 12 * 3600))
+
+CHECKIN_OPENER = (
+    "Ask 2–3 reflective questions based on today's goal *and* their broader progress. "
+    "Be specific, supportive, and concise."
+)
+
+_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="checkin-prefetch")
+_pending = set()
+_pending_lock = threading.Lock()
+
+
+def get_todays_goals(plan: Plan, today: datetime.date) -> List[Dict]:
+    """
+    The plan's goals with an event scheduled on `today`, with display times.
+    """
+    goals = []
+    for event in plan.events or []:
+        try:
+            event_start = datetime.datetime.fromisoformat(event.start)
+            event_end = datetime.datetime.fromisoformat(event.end)
+        except ValueError:
+            continue
+
+        if event_start.date() == today:
+            goal = (plan.goals or {}).get(event.id)
+            if goal:
+                goals.append({
+                    "id": goal.id,
+                    "title": goal.title,
+                    "task": goal.task,
+                    "importance": goal.importance,
+                    "start": event_start.strftime("%I:%M %p"),
+                    "end": event_end.strftime("%I:%M %p")
+                })
+    return goals
+
+
+async def checkin_system_prompt_async(user_email: str, goal: Dict) -> str:
+    day_plan = f"{goal['title']} — {goal['task']}"
+    full_context = (await get_prompt_context_async(user_email, goal["id"], query=day_plan)).text
+
+    return f"""
+    You are running a daily AI check-in with a client.
+
+    Client Goal: {goal['title']}
+    Today's Plan: {day_plan}
+
+    Context from the client’s ongoing goals and progress:
+    {full_context}
+
+    When the client answers, reflect supportively. Give 1 encouragement based on their effort
+    and 1 actionable suggestion based on their broader progress.
+    """
+
+
+def checkin_system_prompt(user_email: str, goal: Dict) -> str:
+    return run_async(checkin_system_prompt_async(user_email, goal))
+
+
+def open_prefetched_session(user_email: str, goal_id: str, today: datetime.date) -> Optional[Tuple[ChatSession, str]]:
+    """
+    A chat session already holding the prefetched opening questions, with the
+    question text, or None if nothing unexpired is stored.
+    """
+    entry = get_prefetched_questions(user_email, today.isoformat(), [goal_id]).get(goal_id)
+    if entry is None:
+        return None
+
+    session = ChatSession(entry["system_prompt"])
+    session.add_turn(CHECKIN_OPENER, entry["questions"])
+    return session, entry["questions"]
+
+
+async def _generate_questions(system_prompt: str) -> str:
+    session = ChatSession(system_prompt)
+    result = await llm_run(CHECKIN_OPENER, None, message_history=session.history(),
+                           site="checkin.prefetch")
+    if getattr(result, "fallback", False):
+        raise RuntimeError("LLM unavailable; leaving these questions to the chat")
+    return result.output.strip()
+
+
+def _prefetch(jobs: List[Tuple[str, Dict]], day: str) -> int:
+    """
+    Generate questions for (user email, goal) pairs in parallel and store them.
+    Returns how many were stored; failed goals are simply left to the chat.
+    """
+    async def _generate_all() -> Tuple[list, list]:
+        # Load every user's document in batched reads, so the prompt builds
+        # below run concurrently off the cache
+        await db_async.get_users(email for email, _ in jobs)
+        prompts = await asyncio.gather(*(checkin_system_prompt_async(email, goal) for email, goal in jobs))
+        questions = await asyncio.gather(*(_generate_questions(p) for p in prompts), return_exceptions=True)
+        return prompts, questions
+
+    by_user: Dict[str, Dict[str, dict]] = {}
+    for (email, goal), prompt, questions in zip(jobs, *run_async(_generate_all())):
+        if not isinstance(questions, Exception):
+            by_user.setdefault(email, {})[goal["id"]] = {"system_prompt": prompt, "questions": questions}
+
+    for email, entries in by_user.items():
+        save_prefetched_questions(email, day, entries, CHECKIN_PREFETCH_TTL)
+    return sum(len(entries) for entries in by_user.values())
+
+
+def _run_prefetch(key: Tuple[str, str], goals: List[Dict]) -> None:
+    try:
+        _prefetch([(key[0], goal) for goal in goals], key[1])
+    finally:
+        with _pending_lock:
+            _pending.discard(key)
+
+
+def prefetch_checkin_questions(user_email: str, plan: Plan, today: datetime.date) -> None:
+    """
+    Queue background generation of opening questions for today's goals that
+    have none stored yet. Does nothing if a prefetch for this day is running.
+    """
+    goals = get_todays_goals(plan, today)
+    if not goals:
+        return
+
+    day = today.isoformat()
+    stored = get_prefetched_questions(user_email, day, [g["id"] for g in goals])
+    goals = [g for g in goals if g["id"] not in stored]
+    if not goals:
+        return
+
+    key = (user_email, day)
+    with _pending_lock:
+        if key in _pending:
+            return
+        _pending.add(key)
+    _executor.submit(_run_prefetch, key, goals)
+
+
+def prefetch_all_checkin_questions(today: Optional[datetime.date] = None) -> int:
+    """
+    Scheduled batch: prefetch today's questions for every client at once.
+    Returns how many goals got questions.
+    """
+    today = today or datetime.datetime.now().date()
+    day = today.isoformat()
+
+    todays_goals = {}
+    for email, plan in get_client_plans():
+        goals = get_todays_goals(Plan.model_validate(plan), today)
+        if goals:
+            todays_goals[email] = goals
+
+    stored = get_all_prefetched_questions(day, {
+        email: [g["id"] for g in goals] for email, goals in todays_goals.items()
+    })
+    jobs = [
+        (email, goal) for email, goals in todays_goals.items()
+        for goal in goals if goal["id"] not in stored.get(email, {})
+    ]
+
+    return _prefetch(jobs, day) if jobs else 0
+
+
+if __name__ == "__main__":
+    print(f"Prefetched check-in questions for {prefetch_all_checkin_questions()} goals")
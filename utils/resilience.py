@@ -0,0 +1,153 @@
+"""
+Failure-handling building blocks for LLM calls: which errors are worth
+retrying, a circuit breaker, per-site latency tracking and request hedging.
+The policy that combines them lives in utils/llm.py.
+"""
+import asyncio
+import threading
+import time
+from collections import deque
+from typing import Awaitable, Callable, Deque, Dict, Optional, TypeVar
+
+import httpx
+from google.genai.errors import APIError
+from pydantic_ai.exceptions import ModelHTTPError
+
+T = TypeVar("T")
+
+RETRYABLE_STATUS = {408, 429, 500, 502, 503, 504}
+
+# Latency samples kept per call site, and needed before a p95 is trusted
+LATENCY_WINDOW = 200
+LATENCY_MIN_SAMPLES = 20
+
+
+class CircuitOpenError(RuntimeError):
+    """
+    Raised instead of calling the provider while the breaker is open.
+    """
+
+
+def is_retryable(exc: BaseException) -> bool:
+    if isinstance(exc, (asyncio.TimeoutError, TimeoutError, httpx.TransportError)):
+        return True
+    if isinstance(exc, ModelHTTPError):
+        return exc.status_code in RETRYABLE_STATUS
+    if isinstance(exc, APIError):
+        return exc.code in RETRYABLE_STATUS
+    return False
+
+
+class CircuitBreaker:
+    """
+    Opens after `threshold` consecutive failures and rejects calls for
+    `cooldown` seconds, then lets one trial call through (half-open): success
+    closes it again, failure reopens it.
+    """
+    def __init__(self, threshold: int, cooldown: float):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self._failures = 0
+        self._opened_at: Optional[float] = None
+        self._trial_running = False
+        self._lock = threading.Lock()
+
+    @property
+    def is_open(self) -> bool:
+        with self._lock:
+            return self._opened_at is not None and time.monotonic() - self._opened_at < self.cooldown
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self._opened_at is None:
+                return True
+            if time.monotonic() - self._opened_at < self.cooldown or self._trial_running:
+                return False
+            self._trial_running = True
+            return True
+
+    def record_success(self) -> None:
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._trial_running = False
+
+    def release(self) -> None:
+        """
+        End a call that says nothing about provider health (cancelled, bad request).
+        """
+        with self._lock:
+            self._trial_running = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self._failures += 1
+            if self._trial_running or self._failures >= self.threshold:
+                self._opened_at = time.monotonic()
+            self._trial_running = False
+
+
+class LatencyTracker:
+    """
+    Rolling latency samples per call site.
+    """
+    def __init__(self, window: int = LATENCY_WINDOW):
+        self._samples: Dict[str, Deque[float]] = {}
+        self._window = window
+        self._lock = threading.Lock()
+
+    def record(self, site: str, seconds: float) -> None:
+        with self._lock:
+            self._samples.setdefault(site, deque(maxlen=self._window)).append(seconds)
+
+    def p95(self, site: str) -> Optional[float]:
+        with self._lock:
+            samples = sorted(self._samples.get(site, ()))
+        if len(samples) < LATENCY_MIN_SAMPLES:
+            return None
+        return samples[int(0.95 * (len(samples) - 1))]
+
+
+async def hedged(call: Callable[[], Awaitable[T]], hedge_after: Optional[float]) -> T:
+    """
+    Await `call()`; if it hasn't finished after `hedge_after` seconds, start a
+    duplicate and return whichever succeeds first, cancelling the other.
+    """
+    if hedge_after is None:
+        return await call()
+
+    tasks = [asyncio.ensure_future(call())]
+    try:
+        done, _ = await asyncio.wait(tasks, timeout=hedge_after)
+        if not done:
+            tasks.append(asyncio.ensure_future(call()))
+
+        error = None
+        pending = set(tasks)
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    return task.result()
+                error = task.exception()
+        raise error
+    finally:
+        for task in tasks:
+            task.cancel()
+
+
+async def first_token_within(call: Awaitable[T], started: asyncio.Event, timeout: float) -> T:
+    """
+    Await a streaming call, allowing it `timeout` seconds to set `started`
+    (its first token) and then as long as it needs to finish.
+    """
+    task = asyncio.ensure_future(call)
+    waiter = asyncio.ensure_future(started.wait())
+    try:
+        await asyncio.wait({task, waiter}, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+        if not task.done() and not started.is_set():
+            raise asyncio.TimeoutError()
+        return await task
+    finally:
+        waiter.cancel()
+        task.cancel()
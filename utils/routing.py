@@ -0,0 +1,126 @@
+"""
+Which model answers each LLM call site.
+
+Every call through utils/llm.py carries a dotted site label such as
+"checkin.feedback". The routing table maps sites to a Route: the model, its
+settings, a cap on output tokens, and the models to fall back to, in order,
+when it times out or is failing. A site without an entry uses its nearest
+dotted parent ("checkin.feedback" -> "checkin"), then "default".
+
+The built-in table below sends short chat turns to a lighter model and
+coach plan extraction to gemini-2.5-flash. Override any of it without code
+changes with JSON of the same shape as DEFAULT_ROUTES, either inline in
+LLM_ROUTES or in a file at LLM_ROUTES_PATH. Each entry's fields replace the
+built-in ones, e.g.
+
+    {"checkin": {"model": "gemini-2.5-flash", "max_tokens": 300}}
+"""
+import json
+import os
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+LLM_ROUTES = os.getenv("LLM_ROUTES")
+LLM_ROUTES_PATH = os.getenv("LLM_ROUTES_PATH")
+
+_NO_THINKING = {"google_thinking_config": {"thinking_budget": 0}}
+
+DEFAULT_ROUTES = {
+    "default": {
+        "model": "gemini-2.5-flash",
+        "settings": _NO_THINKING,
+        "fallbacks": ["gemini-2.5-flash-lite"],
+    },
+    "coach": {
+        "model": "gemini-2.5-flash",
+        "settings": _NO_THINKING,
+        "max_tokens": 2048,
+        "fallbacks": ["gemini-2.5-flash-lite"],
+    },
+    "compaction": {
+        "model": "gemini-2.5-flash",
+        "settings": _NO_THINKING,
+        "max_tokens": 1024,
+        "fallbacks": ["gemini-2.5-flash-lite"],
+    },
+    # Short conversational turns: a lighter, lower-latency model that hands
+    # over to the full one quickly if it stalls
+    "checkin": {
+        "model": "gemini-2.5-flash-lite",
+        "settings": _NO_THINKING,
+        "max_tokens": 512,
+        "timeout": 15,
+        "fallbacks": ["gemini-2.5-flash"],
+    },
+    "main_goal": {
+        "model": "gemini-2.5-flash-lite",
+        "settings": _NO_THINKING,
+        "max_tokens": 512,
+        "timeout": 15,
+        "fallbacks": ["gemini-2.5-flash"],
+    },
+}
+
+
+@dataclass
+class Route:
+    model: str
+    settings: Dict = field(default_factory=dict)
+    max_tokens: Optional[int] = None
+    fallbacks: List[str] = field(default_factory=list)
+    # Deadline for each model in the chain before moving to the next (for
+    # streams, to its first token); None lets the first model use the whole
+    # call deadline
+    timeout: Optional[float] = None
+
+    @property
+    def models(self) -> List[str]:
+        return [self.model, *(m for m in self.fallbacks if m != self.model)]
+
+    def model_settings(self) -> Dict:
+        if self.max_tokens is None:
+            return dict(self.settings)
+        return {**self.settings, "max_tokens": self.max_tokens}
+
+
+def _load_overrides() -> Dict[str, Dict]:
+    if LLM_ROUTES_PATH:
+        with open(LLM_ROUTES_PATH, encoding="utf-8") as f:
+            return json.load(f)
+    if LLM_ROUTES:
+        return json.loads(LLM_ROUTES)
+    return {}
+
+
+def load_routes(overrides: Optional[Dict[str, Dict]] = None) -> Dict[str, Route]:
+    """
+    The built-in table with `overrides` (by default from LLM_ROUTES_PATH or
+    LLM_ROUTES) applied entry by entry.
+    """
+    overrides = _load_overrides() if overrides is None else overrides
+    routes = {}
+    for site in {*DEFAULT_ROUTES, *overrides}:
+        entry = {**DEFAULT_ROUTES.get(site, {}), **overrides.get(site, {})}
+        if "model" not in entry:
+            raise ValueError(f"Route for '{site}' has no model")
+        routes[site] = Route(**entry)
+    return routes
+
+
+_routes = None
+
+
+def get_route(site: str) -> Route:
+    global _routes
+    if _routes is None:
+        _routes = load_routes()
+
+    while site:
+        if site in _routes:
+            return _routes[site]
+        site = site.rpartition(".")[0]
+    return _routes["default"]
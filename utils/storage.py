@@ -0,0 +1,101 @@
+"""
+Storage backend selection for utils/db.py.
+
+STORAGE_BACKEND picks the client every data-access function talks to:
+
+- "firestore" (default): Firebase Admin SDK, credentials from st.secrets.
+- "memory": utils.memory_db.MemoryClient, an in-process stand-in that needs
+  no credentials or network. STORAGE_SEED may point at a JSON file of
+  {"collection/doc": {...}} entries to start from.
+"""
+import os
+
+import firebase_admin
+from dotenv import load_dotenv
+from firebase_admin import credentials, firestore
+import streamlit as st
+
+from utils.memory_db import AsyncMemoryClient, MemoryClient, MemoryTransaction, memory_transactional
+
+load_dotenv()
+
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "firestore").lower()
+STORAGE_SEED = os.getenv("STORAGE_SEED")
+
+
+def _init_firebase_app():
+    if not firebase_admin._apps:
+        # try:
+        #     cred = credentials.Certificate("secrets/firebase_secret.json")
+        # except:
+        cred = credentials.Certificate(dict(st.secrets["firebase"]['fb_secret']))
+        firebase_admin.initialize_app(cred)
+
+    return firebase_admin.get_app()
+
+
+def _init_firebase():
+    _init_firebase_app()
+    return firestore.client()
+
+
+def _init_firebase_async(sync_client):
+    # Built directly rather than via firebase_admin.firestore_async, whose
+    # single cached client can't be shared between event loops
+    app = _init_firebase_app()
+    return firestore.AsyncClient(project=app.project_id, credentials=app.credential.get_credential())
+
+
+def _init_memory():
+    if STORAGE_SEED:
+        return MemoryClient.from_json(STORAGE_SEED)
+    return MemoryClient()
+
+
+def _init_memory_async(sync_client):
+    return AsyncMemoryClient(sync_client)
+
+
+_BACKENDS = {
+    "firestore": _init_firebase,
+    "memory": _init_memory,
+}
+
+_ASYNC_BACKENDS = {
+    "firestore": _init_firebase_async,
+    "memory": _init_memory_async,
+}
+
+
+def create_client(backend: str = STORAGE_BACKEND):
+    """
+    Build a new client for the named backend.
+    """
+    if backend not in _BACKENDS:
+        raise ValueError(f"Unknown STORAGE_BACKEND '{backend}', expected one of {sorted(_BACKENDS)}")
+    return _BACKENDS[backend]()
+
+
+def create_async_client(sync_client, backend: str = STORAGE_BACKEND):
+    """
+    Build an asyncio client for the named backend. The in-memory backend wraps
+    `sync_client` so both APIs see the same data.
+    """
+    if backend not in _ASYNC_BACKENDS:
+        raise ValueError(f"Unknown STORAGE_BACKEND '{backend}', expected one of {sorted(_ASYNC_BACKENDS)}")
+    return _ASYNC_BACKENDS[backend](sync_client)
+
+
+def transactional(to_wrap):
+    """
+    Backend-neutral `firestore.transactional`: wrap a function taking a
+    transaction from `client.transaction()` so it runs atomically.
+    """
+    firestore_wrapped = firestore.transactional(to_wrap)
+    memory_wrapped = memory_transactional(to_wrap)
+
+    def wrapper(transaction, *args, **kwargs):
+        if isinstance(transaction, MemoryTransaction):
+            return memory_wrapped(transaction, *args, **kwargs)
+        return firestore_wrapped(transaction, *args, **kwargs)
+    return wrapper
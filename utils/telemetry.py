@@ -0,0 +1,168 @@
+"""
+Per-call metrics for LLM requests.
+
+Every call through utils/llm.py is recorded with its call-site label, model,
+latency (and time to first token when streamed), token usage, estimated cost,
+cache hit and error. Records go to:
+
+- OpenTelemetry spans and metrics through opentelemetry-api. These are no-ops
+  until an SDK is configured, e.g. by logfire.configure().
+- A local JSON-lines file at LLM_METRICS_PATH (set it empty to disable),
+  appended to by a background thread so calls on the shared event loop never
+  wait on disk. It is rotated once it passes LLM_METRICS_MAX_BYTES, keeping
+  LLM_METRICS_BACKUPS older files (.1, .2, ...).
+"""
+import atexit
+import json
+import logging
+import os
+import queue
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass, field
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+from typing import Iterator, Optional
+
+from opentelemetry import metrics, trace
+from pydantic_ai.usage import Usage
+
+LLM_METRICS_PATH = os.getenv("LLM_METRICS_PATH", os.path.join(".cache", "llm_calls.jsonl"))
+LLM_METRICS_MAX_BYTES = int(os.getenv("LLM_METRICS_MAX_BYTES", 10 * 1024 * 1024))
+LLM_METRICS_BACKUPS = int(os.getenv("LLM_METRICS_BACKUPS", 3))
+
+# USD per million (input, output) tokens
+LLM_PRICES = {
+    "gemini-2.5-flash": (0.30, 2.50),
+    "gemini-2.5-flash-lite": (0.10, 0.40),
+}
+
+_tracer = trace.get_tracer("coachai.llm")
+_meter = metrics.get_meter("coachai.llm")
+
+_calls = _meter.create_counter("llm.calls", description="LLM calls by call site, cache hit and outcome")
+_tokens = _meter.create_counter("llm.tokens", unit="{token}", description="LLM tokens by call site and direction")
+_cost = _meter.create_counter("llm.cost", unit="USD", description="Estimated LLM spend by call site")
+_duration = _meter.create_histogram("llm.duration", unit="s", description="LLM call latency by call site")
+_first_token = _meter.create_histogram("llm.time_to_first_token", unit="s",
+                                       description="Streamed LLM time to first token by call site")
+
+_sink = None
+_sink_listener = None
+_sink_lock = threading.Lock()
+
+
+@dataclass
+class LLMCall:
+    site: str
+    model: str
+    streamed: bool = False
+    cached: bool = False
+    error: Optional[str] = None
+    fallback: Optional[str] = None  # "cache" or "canned" when a degraded answer was served
+    latency: float = 0.0
+    first_token_latency: Optional[float] = None
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    cost_usd: float = 0.0
+    timestamp: str = field(default_factory=lambda: datetime.now(timezone.utc).isoformat())
+    _start: float = field(default_factory=time.perf_counter, repr=False)
+
+    def set_usage(self, usage: Usage) -> None:
+        self.prompt_tokens = usage.request_tokens or 0
+        self.completion_tokens = usage.response_tokens or 0
+        input_price, output_price = LLM_PRICES.get(self.model, (0.0, 0.0))
+        self.cost_usd = (self.prompt_tokens * input_price + self.completion_tokens * output_price) / 1_000_000
+
+    def first_token(self) -> None:
+        if self.first_token_latency is None:
+            self.first_token_latency = time.perf_counter() - self._start
+
+
+def _get_sink() -> Optional[logging.Logger]:
+    """
+    A logger whose lines are queued and written to LLM_METRICS_PATH by a
+    background thread, or None if the file can't be used.
+    """
+    global _sink, _sink_listener
+    with _sink_lock:
+        if _sink is None:
+            try:
+                os.makedirs(os.path.dirname(LLM_METRICS_PATH) or ".", exist_ok=True)
+            except OSError:
+                return None  # metrics must never break a call
+
+            handler = RotatingFileHandler(LLM_METRICS_PATH, maxBytes=LLM_METRICS_MAX_BYTES,
+                                          backupCount=LLM_METRICS_BACKUPS, encoding="utf-8", delay=True)
+            handler.setFormatter(logging.Formatter("%(message)s"))
+            lines = queue.SimpleQueue()
+            _sink_listener = QueueListener(lines, handler)
+            _sink_listener.start()
+
+            # Not registered with logging, so app log config can't reroute it
+            _sink = logging.Logger("coachai.llm.calls", logging.INFO)
+            _sink.addHandler(QueueHandler(lines))
+        return _sink
+
+
+@atexit.register
+def _close_sink() -> None:
+    """
+    Write out any queued lines and stop the sink's thread.
+    """
+    global _sink, _sink_listener
+    with _sink_lock:
+        listener, _sink, _sink_listener = _sink_listener, None, None
+    if listener is not None:
+        listener.stop()
+
+
+def _write(call: LLMCall) -> None:
+    if not LLM_METRICS_PATH:
+        return
+    sink = _get_sink()
+    if sink is not None:
+        sink.info(json.dumps({k: v for k, v in asdict(call).items() if not k.startswith("_")}))
+
+
+def _export(call: LLMCall, span) -> None:
+    attributes = {"llm.site": call.site, "llm.model": call.model}
+    outcome = {**attributes, "llm.cached": call.cached, "llm.error": call.error or "",
+               "llm.fallback": call.fallback or ""}
+
+    _calls.add(1, outcome)
+    _duration.record(call.latency, outcome)
+    if call.first_token_latency is not None:
+        _first_token.record(call.first_token_latency, attributes)
+    _tokens.add(call.prompt_tokens, {**attributes, "llm.direction": "prompt"})
+    _tokens.add(call.completion_tokens, {**attributes, "llm.direction": "completion"})
+    _cost.add(call.cost_usd, attributes)
+
+    span.set_attributes({
+        **outcome,
+        "llm.streamed": call.streamed,
+        "llm.prompt_tokens": call.prompt_tokens,
+        "llm.completion_tokens": call.completion_tokens,
+        "llm.cost_usd": call.cost_usd,
+    })
+
+
+@contextmanager
+def track_llm_call(site: str, model: str, streamed: bool = False) -> Iterator[LLMCall]:
+    """
+    Time an LLM call and record it on exit. The caller fills in usage and the
+    cache flag on the yielded LLMCall; exceptions are recorded and re-raised.
+    """
+    call = LLMCall(site=site, model=model, streamed=streamed)
+    with _tracer.start_as_current_span(f"llm {site}") as span:
+        try:
+            yield call
+        except BaseException as e:
+            call.error = type(e).__name__
+            span.set_status(trace.Status(trace.StatusCode.ERROR, str(e)))
+            raise
+        finally:
+            call.latency = time.perf_counter() - call._start
+            _export(call, span)
+            _write(call)
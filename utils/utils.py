@@ -1,5 +1,7 @@
 import os
 import asyncio
+import concurrent.futures
+import threading
 from utils.models import GoalsLiteOnly, GoalsOnly, Goal
 
 
@@ -23,11 +25,43 @@ def convert_goals(goals_lite: GoalsLiteOnly) -> GoalsOnly:
     return goal_dict
 
 
-def run_async(coro):
+_loop = None
+_loop_lock = threading.Lock()
+
+
+def get_event_loop() -> asyncio.AbstractEventLoop:
+    """
+    Return the process-wide event loop, started on a daemon thread on first use.
+    Async clients (LLM provider, Firestore) are bound to this one loop.
+    """
+    global _loop
+    if _loop is None:
+        with _loop_lock:
+            if _loop is None:
+                loop = asyncio.new_event_loop()
+                threading.Thread(target=loop.run_forever, name="async-loop", daemon=True).start()
+                _loop = loop
+    return _loop
+
+
+def submit_async(coro) -> concurrent.futures.Future:
+    """
+    Schedule a coroutine on the shared loop without waiting for it.
+    """
+    return asyncio.run_coroutine_threadsafe(coro, get_event_loop())
+
+
+def run_async(coro, timeout: float | None = None):
+    """
+    Run a coroutine on the shared loop and block the calling thread for its result.
+    """
+    loop = get_event_loop()
     try:
-        loop = asyncio.get_running_loop()
+        running = asyncio.get_running_loop()
     except RuntimeError:
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-        
-    return loop.run_until_complete(coro)
\ No newline at end of file
+        running = None
+    if running is loop:
+        coro.close()
+        raise RuntimeError("run_async() called from the shared event loop; await the coroutine instead")
+
+    return asyncio.run_coroutine_threadsafe(coro, loop).result(timeout)
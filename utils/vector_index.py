@@ -0,0 +1,238 @@
+"""
+Semantic index over each client's check-in exchanges.
+
+Every exchange saved by utils.exchanges.save_exchange is embedded and stored in
+the user's `exchanges` subcollection, so it stays retrievable after
+compaction folds it out of the goal context. Per-user vectors are loaded into
+a NumPy matrix on first use and searched with one matrix-vector product.
+
+EMBEDDING_BACKEND selects the embedder: "hashing" (default) is a local,
+deterministic bag-of-words embedding that needs no network; "gemini" uses the
+Gemini embedding API through the shared provider in utils/llm.py.
+"""
+import hashlib
+import os
+import re
+import threading
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+
+import numpy as np
+from cachetools import TTLCache
+from google.cloud.firestore_v1.base_query import FieldFilter
+
+from utils.compaction import split_context
+from utils.db import GET_ALL_BATCH_SIZE, get_db, get_user_data, get_user_ref
+
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "hashing")
+EMBEDDING_DIM = int(os.getenv("EMBEDDING_DIM", 256))
+GEMINI_EMBEDDING_MODEL = os.getenv("GEMINI_EMBEDDING_MODEL", "text-embedding-004")
+
+RETRIEVAL_TOP_K = 5
+
+# Loaded per-user indexes, reloaded INDEX_CACHE_TTL seconds after loading (not
+# after last use) so exchanges indexed by other processes show up
+INDEX_CACHE_TTL = 300
+INDEX_CACHE_SIZE = 64
+
+_index_cache = TTLCache(maxsize=INDEX_CACHE_SIZE, ttl=INDEX_CACHE_TTL)
+_index_lock = threading.Lock()
+
+_TOKEN = re.compile(r"[a-z0-9']+")
+
+
+class HashingEmbedder:
+    """
+    Signed feature hashing of word unigrams and bigrams, L2-normalised.
+    Deterministic across processes, so stored vectors stay comparable.
+    """
+    def __init__(self, dim: int = EMBEDDING_DIM):
+        self.dim = dim
+        self.name = f"hashing-{dim}"
+
+    def _features(self, text: str) -> List[str]:
+        words = _TOKEN.findall(text.lower())
+        return words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+
+    def embed(self, texts: List[str]) -> np.ndarray:
+        vectors = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for feature in self._features(text):
+                digest = hashlib.blake2b(feature.encode(), digest_size=8).digest()
+                bucket = int.from_bytes(digest[:4], "little") % self.dim
+                vectors[row, bucket] += 1.0 if digest[4] & 1 else -1.0
+        return _normalise(vectors)
+
+
+class GeminiEmbedder:
+    def __init__(self, model: str = GEMINI_EMBEDDING_MODEL):
+        self.name = f"gemini-{model}"
+        self.model = model
+
+    def embed(self, texts: List[str]) -> np.ndarray:
+        from utils.llm import provider
+        if provider is None:  # LLM_BACKEND=fake
+            from pydantic_ai.providers.google import GoogleProvider
+            provider = GoogleProvider()
+        response = provider.client.models.embed_content(model=self.model, contents=texts)
+        return _normalise(np.array([e.values for e in response.embeddings], dtype=np.float32))
+
+
+def _normalise(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+_embedder = None
+
+
+def get_embedder():
+    global _embedder
+    if _embedder is None:
+        _embedder = GeminiEmbedder() if EMBEDDING_BACKEND == "gemini" else HashingEmbedder()
+    return _embedder
+
+
+class VectorIndex:
+    """
+    In-memory matrix of unit vectors with their exchange metadata.
+    """
+    def __init__(self, dim: int):
+        self._lock = threading.Lock()
+        self.vectors = np.zeros((0, dim), dtype=np.float32)
+        self.entries: List[dict] = []
+        self.ids: Dict[str, int] = {}
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def add(self, doc_ids: List[str], vectors: np.ndarray, entries: List[dict]) -> None:
+        with self._lock:
+            new = [i for i, doc_id in enumerate(doc_ids) if doc_id not in self.ids]
+            if not new:
+                return
+            for i in new:
+                self.ids[doc_ids[i]] = len(self.entries)
+                self.entries.append(entries[i])
+            self.vectors = np.vstack([self.vectors, vectors[new]])
+
+    def search(self, query_vectors: np.ndarray, k: int = RETRIEVAL_TOP_K,
+               goal_id: Optional[str] = None) -> List[List[dict]]:
+        """
+        Return the top `k` entries for each query vector by cosine similarity,
+        optionally restricted to one goal's exchanges.
+        """
+        with self._lock:
+            vectors, entries = self.vectors, self.entries
+        if not entries:
+            return [[] for _ in query_vectors]
+
+        scores = query_vectors @ vectors.T  # (queries, entries); rows are unit length
+        if goal_id is not None:
+            mask = np.array([e["goal_id"] != goal_id for e in entries])
+            scores[:, mask] = -np.inf
+
+        k = min(k, len(entries))
+        top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        results = []
+        for row, candidates in enumerate(top):
+            ranked = candidates[np.argsort(-scores[row, candidates], kind="stable")]
+            results.append([
+                {**entries[i], "score": float(scores[row, i])}
+                for i in ranked if np.isfinite(scores[row, i])
+            ])
+        return results
+
+
+def _exchanges_ref(user_email: str):
+    return get_user_ref(user_email).collection("exchanges")
+
+
+def _exchange_id(goal_id: str, text: str) -> str:
+    return hashlib.sha256(f"{goal_id}|{text}".encode()).hexdigest()[:16]
+
+
+def _load_index(user_email: str) -> VectorIndex:
+    embedder = get_embedder()
+    doc_ids, vectors, entries = [], [], []
+    query = _exchanges_ref(user_email).where(filter=FieldFilter("model", "==", embedder.name))
+    for doc in query.stream():
+        data = doc.to_dict()
+        doc_ids.append(doc.id)
+        vectors.append(data["embedding"])
+        entries.append({k: data.get(k) for k in ("goal_id", "goal_type", "text", "timestamp")})
+
+    index = VectorIndex(len(vectors[0]) if vectors else getattr(embedder, "dim", 0))
+    if vectors:
+        index.add(doc_ids, np.array(vectors, dtype=np.float32), entries)
+    return index
+
+
+def get_index(user_email: str) -> VectorIndex:
+    with _index_lock:
+        index = _index_cache.get(user_email)
+    if index is None:
+        index = _load_index(user_email)
+        with _index_lock:
+            index = _index_cache.setdefault(user_email, index)
+    return index
+
+
+def index_exchanges(user_email: str, goal_id: str, goal_type: str, texts: List[str]) -> int:
+    """
+    Embed and store exchanges for one goal, skipping any already indexed.
+    Returns how many were written.
+    """
+    texts = [t for t in dict.fromkeys(texts) if t.strip()]
+    if not texts:
+        return 0
+
+    embedder = get_embedder()
+    vectors = embedder.embed(texts)
+    timestamp = datetime.now(timezone.utc).isoformat()
+    doc_ids = [_exchange_id(goal_id, t) for t in texts]
+    entries = [
+        {"goal_id": goal_id, "goal_type": goal_type, "text": t, "timestamp": timestamp}
+        for t in texts
+    ]
+
+    for start in range(0, len(texts), GET_ALL_BATCH_SIZE):
+        batch = get_db().batch()
+        for i in range(start, min(start + GET_ALL_BATCH_SIZE, len(texts))):
+            batch.set(_exchanges_ref(user_email).document(doc_ids[i]), {
+                **entries[i],
+                "model": embedder.name,
+                "embedding": vectors[i].tolist(),
+            })
+        batch.commit()
+
+    with _index_lock:
+        index = _index_cache.get(user_email)
+    if index is not None:
+        index.add(doc_ids, vectors, entries)
+    return len(texts)
+
+
+def index_user_history(user_email: str) -> int:
+    """
+    Index every exchange still held in a user's goal contexts.
+    """
+    data = get_user_data(user_email) or {}
+    written = 0
+    for context_key, goal_type in (("main_goal_context", "main"), ("coach_goal_context", "coach")):
+        for goal_id, context in (data.get(context_key) or {}).items():
+            _, exchanges = split_context(context)
+            written += index_exchanges(user_email, goal_id, goal_type, exchanges)
+    return written
+
+
+def search_exchanges(user_email: str, query: str, k: int = RETRIEVAL_TOP_K,
+                     goal_id: Optional[str] = None) -> List[dict]:
+    """
+    Return the `k` stored exchanges most similar to `query`, best first.
+    """
+    index = get_index(user_email)
+    if not len(index) or not query.strip():
+        return []
+    return index.search(get_embedder().embed([query]), k, goal_id)[0]